@@ -1,37 +1,95 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-import pickle
+import time
 
-# Load the saved model and scaler
-try:
-    model = pickle.load(open('breast_cancer.pkl', 'rb'))
-    scaler = pickle.load(open('scaler.pkl', 'rb'))
-except:
-    st.error("Error: Model files not found. Please ensure 'breast_cancer.pkl' and 'scaler.pkl' exist.")
+from inference import FEATURE_COLUMNS, predict_batch
+from neighbors import get_index
+from prediction_cache import get_prediction_cache
+from registry import get_registry
+from sensitivity import DEFAULT_SPAN, DEFAULT_STEPS, influence, sweep
+from telemetry import telemetry
+
+# The registry loads the model and scaler once per process and shares them
+# across sessions and reruns, reloading when the pickle files change
+registry = get_registry()
+
+# Repeated clicks, the sample cases and re-submitted measurements are
+# answered from here; entries are dropped when the model version changes
+cache = get_prediction_cache()
+
+# Form layout: one column per statistic, one field per measurement
+MEASUREMENTS = ['radius', 'texture', 'perimeter', 'area', 'smoothness', 'compactness',
+                'concavity', 'concave points', 'symmetry', 'fractal_dimension']
+SECTIONS = [('mean', 'Mean Values', 'Mean'),
+            ('se', 'Standard Error Values', 'SE'),
+            ('worst', 'Worst Values', 'Worst')]
+
+def load_model():
+    try:
+        return registry.get()
+    except Exception:
+        st.error("Error: Model files not found. Please ensure 'breast_cancer.pkl' and 'scaler.pkl' exist.")
+        return None
 
 def predict_cancer(features_df):
     try:
-        # Scale the features
-        features_scaled = scaler.transform(features_df)
-        
-        # Make prediction
-        prediction = model.predict(features_scaled)
-        probabilities = model.predict_proba(features_scaled)
-        
-        return {
-            'prediction': prediction[0],
-            'benign_probability': probabilities[0][0],
-            'malignant_probability': probabilities[0][1]
-        }
+        loaded = registry.get()
+        model, scaler = loaded.model, loaded.scaler
+
+        def compute(values):
+            # Scale the features and make the prediction (label and
+            # probabilities from one kernel evaluation)
+            features = pd.DataFrame([values], columns=loaded.feature_columns)
+            prediction, probabilities = predict_batch(model, scaler, features)
+
+            return {
+                'prediction': prediction[0],
+                'benign_probability': probabilities[0][0],
+                'malignant_probability': probabilities[0][1]
+            }
+
+        result = cache.get_or_compute(features_df.iloc[0].to_dict(), loaded.version, compute,
+                                      loaded.feature_columns)
+        result = dict(result)
+        result['neighbors'] = similar_cases(loaded, features_df)
+        return result
     except Exception as e:
+        telemetry.record_error(e, 'app')
         st.error(f"Prediction Error: {str(e)}")
         return None
 
+def similar_cases(loaded, features_df, k=5):
+    # The k nearest labeled cases of data1.csv in the scaled feature space.
+    # A missing reference set only loses this list, not the prediction.
+    try:
+        index = get_index(loaded.scaler.mean_, loaded.scaler.scale_, loaded.feature_columns)
+        return index.neighbors(features_df[loaded.feature_columns].to_numpy(dtype=float), k)[0]
+    except Exception as e:
+        telemetry.record_error(e, 'app.neighbors')
+        return None
+
+def sensitivity_sweep(values, span):
+    # Every feature swept on its own around the entered values; the whole
+    # grid is one scaler+SVC call
+    try:
+        loaded = registry.get()
+        start = time.perf_counter()
+        curves, swept = sweep(loaded.model, loaded.scaler, [values[c] for c in loaded.feature_columns],
+                              loaded.feature_columns, DEFAULT_STEPS, span)
+        return curves, swept, time.perf_counter() - start
+    except Exception as e:
+        telemetry.record_error(e, 'app')
+        st.error(f"Sensitivity Error: {str(e)}")
+        return None
+
 def main():
     st.title('TUMO TRACK')
     st.write('Enter patient measurements to predict breast cancer diagnosis')
+
+    loaded = load_model()
+    if loaded:
+        st.caption(f"Model version {loaded.version} · loaded in {loaded.load_seconds * 1000:.0f} ms")
     
     # Sample data buttons
     col1, col2 = st.columns(2)
@@ -70,58 +128,35 @@ def main():
             st.session_state.update(return_dict)
             st.success("Malignant sample data loaded! Scroll down and click 'Predict'")
 
+    # Only ask for the measurements the deployed model uses
+    required = loaded.feature_columns if loaded else FEATURE_COLUMNS
+    if len(required) < len(FEATURE_COLUMNS):
+        st.caption(f"This model uses {len(required)} of the {len(FEATURE_COLUMNS)} measurements")
+
     # Create columns for better layout
-    col1, col2, col3 = st.columns(3)
+    layout = st.columns(3)
     
     input_features = {}
     
-    with col1:
-        st.subheader('Mean Values')
-        input_features['radius_mean'] = st.number_input('Radius Mean', value=st.session_state.get('radius_mean', 0.0), format="%.4f")
-        input_features['texture_mean'] = st.number_input('Texture Mean', value=st.session_state.get('texture_mean', 0.0), format="%.4f")
-        input_features['perimeter_mean'] = st.number_input('Perimeter Mean', value=st.session_state.get('perimeter_mean', 0.0), format="%.4f")
-        input_features['area_mean'] = st.number_input('Area Mean', value=st.session_state.get('area_mean', 0.0), format="%.4f")
-        input_features['smoothness_mean'] = st.number_input('Smoothness Mean', value=st.session_state.get('smoothness_mean', 0.0), format="%.4f")
-        input_features['compactness_mean'] = st.number_input('Compactness Mean', value=st.session_state.get('compactness_mean', 0.0), format="%.4f")
-        input_features['concavity_mean'] = st.number_input('Concavity Mean', value=st.session_state.get('concavity_mean', 0.0), format="%.4f")
-        input_features['concave points_mean'] = st.number_input('Concave Points Mean', value=st.session_state.get('concave points_mean', 0.0), format="%.4f")
-        input_features['symmetry_mean'] = st.number_input('Symmetry Mean', value=st.session_state.get('symmetry_mean', 0.0), format="%.4f")
-        input_features['fractal_dimension_mean'] = st.number_input('Fractal Dimension Mean', value=st.session_state.get('fractal_dimension_mean', 0.0), format="%.4f")
-    
-    with col2:
-        st.subheader('Standard Error Values')
-        input_features['radius_se'] = st.number_input('Radius SE', value=st.session_state.get('radius_se', 0.0), format="%.4f")
-        input_features['texture_se'] = st.number_input('Texture SE', value=st.session_state.get('texture_se', 0.0), format="%.4f")
-        input_features['perimeter_se'] = st.number_input('Perimeter SE', value=st.session_state.get('perimeter_se', 0.0), format="%.4f")
-        input_features['area_se'] = st.number_input('Area SE', value=st.session_state.get('area_se', 0.0), format="%.4f")
-        input_features['smoothness_se'] = st.number_input('Smoothness SE', value=st.session_state.get('smoothness_se', 0.0), format="%.4f")
-        input_features['compactness_se'] = st.number_input('Compactness SE', value=st.session_state.get('compactness_se', 0.0), format="%.4f")
-        input_features['concavity_se'] = st.number_input('Concavity SE', value=st.session_state.get('concavity_se', 0.0), format="%.4f")
-        input_features['concave points_se'] = st.number_input('Concave Points SE', value=st.session_state.get('concave points_se', 0.0), format="%.4f")
-        input_features['symmetry_se'] = st.number_input('Symmetry SE', value=st.session_state.get('symmetry_se', 0.0), format="%.4f")
-        input_features['fractal_dimension_se'] = st.number_input('Fractal Dimension SE', value=st.session_state.get('fractal_dimension_se', 0.0), format="%.4f")
-    
-    with col3:
-        st.subheader('Worst Values')
-        input_features['radius_worst'] = st.number_input('Radius Worst', value=st.session_state.get('radius_worst', 0.0), format="%.4f")
-        input_features['texture_worst'] = st.number_input('Texture Worst', value=st.session_state.get('texture_worst', 0.0), format="%.4f")
-        input_features['perimeter_worst'] = st.number_input('Perimeter Worst', value=st.session_state.get('perimeter_worst', 0.0), format="%.4f")
-        input_features['area_worst'] = st.number_input('Area Worst', value=st.session_state.get('area_worst', 0.0), format="%.4f")
-        input_features['smoothness_worst'] = st.number_input('Smoothness Worst', value=st.session_state.get('smoothness_worst', 0.0), format="%.4f")
-        input_features['compactness_worst'] = st.number_input('Compactness Worst', value=st.session_state.get('compactness_worst', 0.0), format="%.4f")
-        input_features['concavity_worst'] = st.number_input('Concavity Worst', value=st.session_state.get('concavity_worst', 0.0), format="%.4f")
-        input_features['concave points_worst'] = st.number_input('Concave Points Worst', value=st.session_state.get('concave points_worst', 0.0), format="%.4f")
-        input_features['symmetry_worst'] = st.number_input('Symmetry Worst', value=st.session_state.get('symmetry_worst', 0.0), format="%.4f")
-        input_features['fractal_dimension_worst'] = st.number_input('Fractal Dimension Worst', value=st.session_state.get('fractal_dimension_worst', 0.0), format="%.4f")
+    for col, (suffix, heading, label_suffix) in zip(layout, SECTIONS):
+        with col:
+            st.subheader(heading)
+            for measurement in MEASUREMENTS:
+                name = f'{measurement}_{suffix}'
+                if name in required:
+                    label = f"{measurement.replace('_', ' ').title()} {label_suffix}"
+                    input_features[name] = st.number_input(label, value=st.session_state.get(name, 0.0), format="%.4f")
 
     # Create a button to make predictions
     if st.button('Predict'):
         # Convert input features to DataFrame
-        features_df = pd.DataFrame([input_features])
+        with telemetry.stage('assemble'):
+            features_df = pd.DataFrame([input_features])
         
         # Make prediction
         result = predict_cancer(features_df)
         
+        render_start = time.perf_counter()
         if result:
             # Create a nice display for the results
             st.subheader('Prediction Results')
@@ -144,6 +179,14 @@ def main():
                 st.metric("Malignant Probability", f"{result['malignant_probability']:.1%}")
                 st.progress(result['malignant_probability'])
             
+            if result['neighbors']:
+                st.write("🔎 Most similar cases in the reference data:")
+                st.dataframe(pd.DataFrame([
+                    {'id': case['id'],
+                     'diagnosis': 'MALIGNANT' if case['diagnosis'] == 'M' else 'BENIGN',
+                     'distance': round(case['distance'], 3)}
+                    for case in result['neighbors']]), hide_index=True)
+
             # Add interpretation
             st.write("---")
             st.write("📊 Interpretation:")
@@ -164,6 +207,30 @@ def main():
             This prediction is based on a machine learning model and should not be used as the sole basis for medical decisions. 
             Please consult with healthcare professionals for proper diagnosis and treatment.
             """)
+        telemetry.observe_stage('render', time.perf_counter() - render_start)
+
+    with st.expander("What-if Sensitivity"):
+        st.write("How the malignant probability moves as each measurement varies on its own, "
+                 "in training standard deviations around the entered values.")
+        span = st.slider('Sweep range (± standard deviations)', 0.5, 4.0, DEFAULT_SPAN, 0.5)
+        if loaded and st.checkbox('Run sweep on the entered values'):
+            sweep_result = sensitivity_sweep(input_features, span)
+            if sweep_result:
+                curves, swept, seconds = sweep_result
+                ranking = influence(curves)
+                st.caption(f"{curves.size} what-if cases scored in one call in {seconds * 1000:.0f} ms")
+                chosen = st.multiselect('Features', list(curves.columns), default=list(ranking.index[:5]))
+                if chosen:
+                    st.line_chart(curves[chosen])
+                    st.dataframe(swept[chosen].iloc[::6])
+                st.write("Largest change in malignant probability per feature:")
+                st.bar_chart(ranking)
+
+    with st.expander("Prediction Cache Stats"):
+        st.json(cache.stats())
+
+    with st.expander("Prediction Metrics"):
+        st.code(telemetry.prometheus_text(), language='text')
 
     # Add information about the features
     with st.expander("See Feature Descriptions"):
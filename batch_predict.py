@@ -0,0 +1,120 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from dataset import count_rows
+from inference import (FEATURE_COLUMNS, ID_COLUMN, LABEL_COLUMN, MODEL_PATH,
+                       SCALER_PATH, feature_frame, load_model, model_columns,
+                       predict_batch, results_frame)
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def iter_scored_chunks(input_path, predict, chunk_size=DEFAULT_CHUNK_SIZE, columns=FEATURE_COLUMNS, cached=False):
+    # Yields one results frame per chunk. `predict` takes a frame of the
+    # model's feature columns and returns (prediction, probabilities).
+    # By default the CSV is streamed, so scoring starts with the first
+    # chunk and leaves nothing behind. With cached=True, meant for files
+    # that are scored repeatedly, rows come from the input's columnar cache
+    # (built on first use, see dataset.py). Files the cache cannot hold,
+    # such as ones with non-numeric ids or in read-only directories, are
+    # still streamed.
+    data = None
+    if cached:
+        try:
+            data = dataset.load(input_path)
+        except (OSError, ValueError, TypeError):
+            data = None
+    if data is None:
+        yield from _iter_csv_chunks(input_path, predict, chunk_size, columns)
+        return
+
+    # Decodes the cached int8 labels (-1 missing, 0 benign, 1 malignant)
+    diagnosis = np.array([None, 'B', 'M'], dtype=object)
+    for start in range(0, len(data.features), chunk_size):
+        rows = slice(start, start + chunk_size)
+        chunk = pd.DataFrame(dataset.select(data, columns, rows), columns=columns,
+                             index=pd.RangeIndex(start, start + len(data.features[rows])))
+        prediction, probabilities = predict(feature_frame(chunk, columns))
+        out = results_frame(prediction, probabilities, index=chunk.index)
+
+        passthrough = {}
+        if data.ids is not None:
+            passthrough[ID_COLUMN] = data.ids[rows]
+        if data.labels is not None:
+            passthrough[LABEL_COLUMN] = diagnosis[data.labels[rows] + 1]
+        yield pd.concat([pd.DataFrame(passthrough, index=chunk.index), out], axis=1)
+
+
+def _iter_csv_chunks(input_path, predict, chunk_size, columns):
+    # Only read the columns we need, so neither the trailing 'Unnamed: 32'
+    # column nor features the model does not use are ever parsed;
+    # id/diagnosis are passed through when present
+    wanted = set(columns) | {ID_COLUMN, LABEL_COLUMN}
+    reader = pd.read_csv(input_path, usecols=lambda col: col in wanted,
+                         chunksize=chunk_size)
+
+    for chunk in reader:
+        prediction, probabilities = predict(feature_frame(chunk, columns))
+        out = results_frame(prediction, probabilities, index=chunk.index)
+
+        passthrough = [col for col in (ID_COLUMN, LABEL_COLUMN) if col in chunk.columns]
+        yield pd.concat([chunk[passthrough], out], axis=1)
+
+
+def score_csv(input_path, output_path, model, scaler, chunk_size=DEFAULT_CHUNK_SIZE, cached=False):
+    return write_scored(input_path, output_path, lambda features: predict_batch(model, scaler, features),
+                        model_columns(scaler), chunk_size, cached)
+
+
+def write_scored(input_path, output_path, predict, columns, chunk_size=DEFAULT_CHUNK_SIZE, cached=False):
+    rows = 0
+    start = time.perf_counter()
+    for i, out in enumerate(iter_scored_chunks(input_path, predict, chunk_size, columns, cached)):
+        # Append each chunk as soon as it is scored so memory stays flat
+        out.to_csv(output_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        rows += len(out)
+
+    elapsed = time.perf_counter() - start
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a data1.csv-shaped file in chunks')
+    parser.add_argument('input', help='CSV with the feature columns the model was trained on')
+    parser.add_argument('output', help='CSV to write predictions to')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--cache', action='store_true',
+                        help='read the input through its columnar cache (for files scored repeatedly)')
+    parser.add_argument('--cascade', metavar='VERSION_DIR',
+                        help="score with that train.py version's LR first and escalate uncertain rows")
+    parser.add_argument('--second', choices=['svc', 'ensemble'], default='svc',
+                        help='second cascade stage')
+    parser.add_argument('--band', default='0.1,0.9',
+                        help='malignant probability range the first stage escalates')
+    args = parser.parse_args()
+
+    if args.cascade:
+        from cascade import Cascade
+
+        band = tuple(float(v) for v in args.band.split(','))
+        cascade = Cascade.from_version(args.cascade, args.second, band)
+        rows, elapsed = write_scored(args.input, args.output, lambda features: cascade.predict(features.to_numpy()),
+                                     cascade.feature_columns, args.chunk_size, args.cache)
+    else:
+        model, scaler = load_model(args.model, args.scaler)
+        rows, elapsed = score_csv(args.input, args.output, model, scaler, args.chunk_size, args.cache)
+
+    rate = rows / elapsed if elapsed > 0 else float('inf')
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+    if args.cascade:
+        print(f"Escalated {cascade.stats()['escalated_fraction']:.1%} of rows to {args.second}")
+
+
+if __name__ == '__main__':
+    main()
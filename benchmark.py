@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from compact_model import ARTIFACT_PATH, CompactPredictor, platt_probabilities
+from inference import FEATURE_COLUMNS, PickledPredictor, _libsvm_decision, load_model, model_columns
+from registry import get_registry
+from telemetry import telemetry
+
+BATCH_SIZES = (1, 64, 4096, 100000)
+BASELINE_DIR = 'benchmarks'
+DEFAULT_TOLERANCE = 0.25
+
+
+def make_rows(n, seed=0, data_path='data1.csv'):
+    # Resample data1.csv rows with a little multiplicative noise so large
+    # batches are realistic but not just repeats
+    base = np.asarray(dataset.select(dataset.load(data_path), FEATURE_COLUMNS))
+    rng = np.random.default_rng(seed)
+    rows = base[rng.integers(0, len(base), n)]
+    return rows * rng.normal(1.0, 0.02, rows.shape)
+
+
+def select_columns(rows, columns):
+    # make_rows output narrowed to the columns a model was trained on
+    return rows[:, [FEATURE_COLUMNS.index(col) for col in columns]]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class SklearnPipeline:
+    # Pickled scaler + any sklearn-style classifier, split into the stages
+    # the entry points go through
+    def __init__(self, name, model, scaler, assembly):
+        self.name = name
+        self.model = model
+        self.scaler = scaler
+        self.assembly = assembly
+        self.columns = model_columns(scaler)
+        self.is_svc = getattr(model, '_impl', None) == 'c_svc' and model.probability
+
+    def assemble(self, rows):
+        if self.assembly == 'dataframe':
+            # app.py: one dict per row turned into a DataFrame
+            return pd.DataFrame(rows, columns=self.columns)
+        # main1.py: list of floats reshaped into a NumPy row
+        return np.asarray(rows, dtype=np.float64).reshape(len(rows), -1)
+
+    def run(self, rows):
+        timings = {}
+        features, timings['assemble'] = _timed(self.assemble, rows)
+        scaled, timings['scale'] = _timed(self.scaler.transform, features)
+        if self.is_svc:
+            decision, timings['decision'] = _timed(_libsvm_decision, self.model, scaled)
+            _, timings['calibrate'] = _timed(platt_probabilities, decision,
+                                             self.model._probA[0], self.model._probB[0])
+        else:
+            _, timings['decision'] = _timed(self.model.predict_proba, scaled)
+            timings['calibrate'] = 0.0
+        return timings
+
+
+class CompactPipeline:
+    name = 'compact-svc'
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.columns = predictor.feature_columns
+
+    def run(self, rows):
+        p = self.predictor
+        timings = {}
+        features, timings['assemble'] = _timed(np.asarray, rows, np.float64)
+        scaled, timings['scale'] = _timed(lambda x: (x - p.mean) / p.scale, features)
+        decision, timings['decision'] = _timed(p.decision_function, scaled)
+        _, timings['calibrate'] = _timed(platt_probabilities, decision, p.prob_a, p.prob_b)
+        return timings
+
+
+def bench_single_row(pipeline, rows, repeats):
+    totals = []
+    stages = {}
+    for i in range(repeats):
+        timings = pipeline.run(rows[i % len(rows)][None, :])
+        totals.append(sum(timings.values()))
+        for stage, seconds in timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    totals = np.array(totals) * 1e6
+    return {
+        'p50_us': float(np.percentile(totals, 50)),
+        'p99_us': float(np.percentile(totals, 99)),
+        'stages_p50_us': {stage: float(np.percentile(v, 50) * 1e6) for stage, v in stages.items()},
+    }
+
+
+def bench_batch(pipeline, rows, sizes, min_seconds=0.2):
+    results = {}
+    for size in sizes:
+        batch = rows[:size]
+        runs = []
+        start = time.perf_counter()
+        while not runs or time.perf_counter() - start < min_seconds:
+            runs.append(pipeline.run(batch))
+        best = min(runs, key=lambda t: sum(t.values()))
+        total = sum(best.values())
+        results[str(size)] = {
+            'rows_per_second': size / total,
+            'stages_ms': {stage: seconds * 1000 for stage, seconds in best.items()},
+        }
+    return results
+
+
+def pipelines(version_dir=None):
+    model, scaler = load_model()
+    found = [SklearnPipeline('svc-dataframe', model, scaler, 'dataframe'),
+             SklearnPipeline('svc-numpy', model, scaler, 'numpy')]
+    if os.path.exists(ARTIFACT_PATH):
+        found.append(CompactPipeline(CompactPredictor.load(ARTIFACT_PATH)))
+
+    # The other notebook families, from a train.py output directory
+    if version_dir:
+        from train import load_version
+
+        for name in sorted(os.listdir(os.path.join(version_dir, 'models'))):
+            family = name[:-len('.pkl')]
+            model, scaler, _ = load_version(version_dir, family)
+            found.append(SklearnPipeline(family, model, scaler, 'numpy'))
+    return found
+
+
+def run(sizes=BATCH_SIZES, repeats=1000, version_dir=None):
+    rows = make_rows(max(sizes))
+    report = {
+        'model_version': get_registry().get().version,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'pipelines': {},
+    }
+    for pipeline in pipelines(version_dir):
+        subset = select_columns(rows, pipeline.columns)
+        report['pipelines'][pipeline.name] = {
+            'features': len(pipeline.columns),
+            'single_row': bench_single_row(pipeline, subset, repeats),
+            'batch': bench_batch(pipeline, subset, sizes),
+        }
+    return report
+
+
+def telemetry_overhead(rows, repeats=2000):
+    # Same single-row predictions with instrumentation on and off,
+    # interleaved so drift affects both sides equally
+    results = {}
+    predictors = [('pickled-svc', PickledPredictor.load())]
+    if os.path.exists(ARTIFACT_PATH):
+        predictors.append(('compact-svc', CompactPredictor.load(ARTIFACT_PATH)))
+    for name, predictor in predictors:
+        timings = {True: [], False: []}
+        subset = select_columns(rows, predictor.feature_columns)
+        for i in range(repeats):
+            row = subset[i % len(subset)][None, :]
+            for enabled in (True, False):
+                telemetry.enabled = enabled
+                start = time.perf_counter()
+                predictor.predict(row)
+                timings[enabled].append(time.perf_counter() - start)
+        telemetry.enabled = True
+        on, off = np.median(timings[True]), np.median(timings[False])
+        results[name] = {'on_us': on * 1e6, 'off_us': off * 1e6, 'overhead_pct': (on - off) / off * 100}
+    return results
+
+
+def regressions(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Latency that grew, or throughput that shrank, by more than tolerance
+    found = []
+    for name, current in report['pipelines'].items():
+        previous = baseline['pipelines'].get(name)
+        if previous is None:
+            continue
+        for key in ('p50_us', 'p99_us'):
+            old, new = previous['single_row'][key], current['single_row'][key]
+            if new > old * (1 + tolerance):
+                found.append(f"{name} single-row {key}: {old:.1f} -> {new:.1f}")
+        for size, stats in current['batch'].items():
+            if size not in previous['batch']:
+                continue
+            old, new = previous['batch'][size]['rows_per_second'], stats['rows_per_second']
+            if new < old * (1 - tolerance):
+                found.append(f"{name} batch {size} rows/s: {old:,.0f} -> {new:,.0f}")
+    return found
+
+
+def print_report(report):
+    print(f"model version {report['model_version']}")
+    for name, r in report['pipelines'].items():
+        single = r['single_row']
+        stages = ', '.join(f"{k} {v:.1f}" for k, v in single['stages_p50_us'].items())
+        features = r.get('features', len(FEATURE_COLUMNS))
+        print(f"{name:<14} {features} features, single row p50 {single['p50_us']:8.1f} us  p99 {single['p99_us']:8.1f} us  ({stages})")
+        for size, stats in r['batch'].items():
+            stages = ', '.join(f"{k} {v:.2f}" for k, v in stats['stages_ms'].items())
+            print(f"{'':<14} batch {size:>6}: {stats['rows_per_second']:>12,.0f} rows/s  (ms: {stages})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prediction path stage by stage')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in BATCH_SIZES))
+    parser.add_argument('--repeats', type=int, default=1000, help='single-row predictions to time')
+    parser.add_argument('--version-dir', help='train.py output to benchmark the other families from')
+    parser.add_argument('--save', action='store_true', help=f'write the report to {BASELINE_DIR}/<model version>.json')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--telemetry-overhead', action='store_true',
+                        help='only measure the cost of the prediction instrumentation')
+    args = parser.parse_args()
+
+    # main1.py-style NumPy input makes every scaler.transform warn about
+    # missing feature names; that is expected here
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    if args.telemetry_overhead:
+        for name, r in telemetry_overhead(make_rows(1000), args.repeats).items():
+            print(f"{name:<12} on {r['on_us']:8.1f} us  off {r['off_us']:8.1f} us  overhead {r['overhead_pct']:+.1f}%")
+        return
+
+    sizes = tuple(int(s) for s in args.sizes.split(','))
+    report = run(sizes, args.repeats, args.version_dir)
+    print_report(report)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{report['model_version']}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            raise SystemExit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import dataset
+from benchmark import make_rows, select_columns
+from compact_model import check_finite
+from inference import predict_with_proba
+from telemetry import telemetry
+from train import DATA_PATH, load_version
+
+# Two-stage scoring: logistic regression (one dot product per row) answers
+# the clear cases, and only rows whose malignant probability falls inside
+# the uncertainty band are re-scored by the SVC or by an ensemble of the
+# notebook's models.
+
+DEFAULT_BAND = (0.1, 0.9)
+# Bands compared by the benchmark, narrowest escalation first
+BENCH_BANDS = ((0.3, 0.7), (0.2, 0.8), (0.1, 0.9), (0.05, 0.95), (0.02, 0.98), (0.01, 0.99))
+ENSEMBLE_FAMILIES = ('svc', 'rf', 'gbdt', 'xgb', 'knn')
+BENCH_ROWS = 100000
+
+
+def _malignant_proba(model, X):
+    # (prediction, malignant probability) for one model; the SVC goes
+    # through the fused single-kernel path
+    if getattr(model, '_impl', None) == 'c_svc':
+        prediction, probabilities = predict_with_proba(model, X)
+        return prediction, probabilities[:, 1]
+    proba = model.predict_proba(X)[:, list(model.classes_).index(1)]
+    return (proba > 0.5).astype(int), proba
+
+
+class Cascade:
+    def __init__(self, first, second, scaler, feature_columns, band=DEFAULT_BAND):
+        # first: a fitted LogisticRegression; second: {family: model}, one
+        # SVC or several models averaged as an ensemble. All share the scaler.
+        self.second = second
+        self.feature_columns = list(feature_columns)
+        self.band = band
+        self.mean = scaler.mean_
+        self.scale = scaler.scale_
+        self._coef = first.coef_[0] if first.classes_[1] == 1 else -first.coef_[0]
+        self._intercept = first.intercept_[0] if first.classes_[1] == 1 else -first.intercept_[0]
+        self._pool = ThreadPoolExecutor(len(second)) if len(second) > 1 else None
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.escalated = 0
+
+    @classmethod
+    def from_version(cls, version_dir, second='svc', band=DEFAULT_BAND, families=ENSEMBLE_FAMILIES):
+        first, scaler, columns = load_version(version_dir, 'lr')
+        if second == 'svc':
+            names = ['svc']
+        else:
+            names = [f for f in families if os.path.exists(os.path.join(version_dir, 'models', f'{f}.pkl'))]
+        return cls(first, {f: load_version(version_dir, f)[0] for f in names}, scaler, columns, band)
+
+    def first_stage(self, X):
+        return 1.0 / (1.0 + np.exp(-(X @ self._coef + self._intercept)))
+
+    def second_stage(self, X):
+        if self._pool is None:
+            return _malignant_proba(next(iter(self.second.values())), X)
+        # Models scored in parallel; their probabilities are averaged
+        results = list(self._pool.map(lambda model: _malignant_proba(model, X), self.second.values()))
+        proba = np.mean([p for _, p in results], axis=0)
+        return (proba > 0.5).astype(int), proba
+
+    def score(self, features):
+        # Returns (prediction, probabilities, escalated mask)
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected {len(self.feature_columns)} features, got {features.shape[1]}")
+        check_finite(features)
+
+        t0 = time.perf_counter()
+        X = (features - self.mean) / self.scale
+        proba = self.first_stage(X)
+        prediction = (proba > 0.5).astype(int)
+        low, high = self.band
+        escalated = (proba >= low) & (proba <= high)
+        rows = np.flatnonzero(escalated)
+        t1 = time.perf_counter()
+        if rows.size:
+            prediction[rows], proba[rows] = self.second_stage(X[rows])
+        t2 = time.perf_counter()
+
+        with self._lock:
+            self.rows += len(features)
+            self.escalated += rows.size
+        telemetry.record_predictions(prediction, {'first_stage': t1 - t0, 'escalate': t2 - t1})
+        return prediction, np.column_stack([1.0 - proba, proba]), escalated
+
+    def predict(self, features):
+        # Same interface as CompactPredictor / PickledPredictor
+        prediction, probabilities, _ = self.score(features)
+        return prediction, probabilities
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rows': self.rows,
+                'escalated': self.escalated,
+                'escalated_fraction': self.escalated / self.rows if self.rows else 0.0,
+            }
+
+
+def _best_seconds(fn, X, repeats=3):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(version_dir, second='svc', bands=BENCH_BANDS, data_path=DATA_PATH, rows=BENCH_ROWS):
+    # Agreement with the SVC-only baseline and accuracy on every row of
+    # data1.csv (training rows included), throughput on a resampled batch
+    cascade = Cascade.from_version(version_dir, second)
+    svc, _, _ = load_version(version_dir, 'svc')
+    data = dataset.load(data_path)
+    X = np.asarray(dataset.select(data, cascade.feature_columns))
+    y = np.asarray(data.labels)
+    batch = select_columns(make_rows(rows), cascade.feature_columns)
+
+    def svc_only(features):
+        return predict_with_proba(svc, (features - cascade.mean) / cascade.scale)
+
+    baseline_prediction = svc_only(X)[0]
+    baseline_seconds = _best_seconds(svc_only, batch)
+    report = {
+        'second_stage': second,
+        'baseline': {'accuracy': float(np.mean(baseline_prediction == y)),
+                     'rows_per_second': rows / baseline_seconds},
+        'bands': [],
+    }
+    for band in bands:
+        cascade.band = band
+        prediction, _, escalated = cascade.score(X)
+        _, _, batch_escalated = cascade.score(batch)
+        seconds = _best_seconds(cascade.predict, batch)
+        report['bands'].append({
+            'band': list(band),
+            'escalated_fraction': float(escalated.mean()),
+            'batch_escalated_fraction': float(batch_escalated.mean()),
+            'agreement': float(np.mean(prediction == baseline_prediction)),
+            'accuracy': float(np.mean(prediction == y)),
+            'rows_per_second': rows / seconds,
+            'speedup': baseline_seconds / seconds,
+        })
+    return report
+
+
+def print_report(report):
+    base = report['baseline']
+    print(f"svc only: accuracy {base['accuracy']:.4f}, {base['rows_per_second']:,.0f} rows/s")
+    print(f"cascade lr -> {report['second_stage']}")
+    print(f"{'band':<13} {'escalated':>9} {'(batch)':>8} {'agree':>7} {'acc':>7} {'rows/s':>12} {'speedup':>8}")
+    for r in report['bands']:
+        band = f"[{r['band'][0]:g}, {r['band'][1]:g}]"
+        print(f"{band:<13} {r['escalated_fraction']:>9.1%} {r['batch_escalated_fraction']:>8.1%} "
+              f"{r['agreement']:>7.4f} {r['accuracy']:>7.4f} {r['rows_per_second']:>12,.0f} {r['speedup']:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the LR -> SVC/ensemble cascade against the SVC alone')
+    parser.add_argument('version_dir', help='train.py output directory with lr and svc models')
+    parser.add_argument('--second', choices=['svc', 'ensemble'], default='svc')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--rows', type=int, default=BENCH_ROWS, help='rows in the timed batch')
+    args = parser.parse_args()
+
+    print_report(benchmark(args.version_dir, args.second, data_path=args.data, rows=args.rows))
+
+
+if __name__ == '__main__':
+    main()
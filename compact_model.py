@@ -0,0 +1,257 @@
+import hashlib
+import json
+import math
+import os
+import struct
+import time
+
+import numpy as np
+
+from telemetry import telemetry
+
+# NumPy-only predictor for the exported SVC artifact. Deliberately imports
+# neither sklearn nor pandas so processes that only score start fast.
+
+ARTIFACT_PATH = 'breast_cancer.bin'
+
+MAGIC = b'BCSVM\x00\x01\x00'
+ALIGNMENT = 64
+BLOCK_ROWS = 8192
+
+
+def check_finite(X):
+    # sklearn's validation rejects NaN and infinity; the fused paths skip it,
+    # so they check here (one pass over the rows) and raise the same way
+    if not np.isfinite(X).all():
+        kind = 'NaN' if np.isnan(X).any() else 'infinity or a value too large for dtype(\'float64\')'
+        raise ValueError(f"Input X contains {kind}.")
+
+
+def _sigmoid_predict(decision, prob_a, prob_b):
+    # libsvm's sigmoid_predict; math.exp keeps the results bit-identical to
+    # the C code (np.exp may differ in the last ulp)
+    f = decision * prob_a + prob_b
+    e = np.fromiter(map(math.exp, (-np.abs(f)).tolist()), dtype=np.float64, count=f.size)
+    return np.where(f >= 0, e / (1.0 + e), 1.0 / (1 + e))
+
+
+def _pairwise_coupling_row(r, max_iter=100, eps=0.005 / 2):
+    # libsvm's multiclass_probability for k=2, for a single row. sklearn's
+    # libsvm always runs this iteration, even for binary problems, so the
+    # plain Platt value is not exactly what predict_proba returns.
+    q00 = (1 - r) * (1 - r)
+    q11 = r * r
+    q01 = -(1 - r) * r
+    p0 = p1 = 0.5
+    for _ in range(max_iter):
+        qp0 = q00 * p0 + q01 * p1
+        qp1 = q01 * p0 + q11 * p1
+        pqp = p0 * qp0 + p1 * qp1
+        if max(abs(qp0 - pqp), abs(qp1 - pqp)) < eps:
+            break
+
+        diff = (-qp0 + pqp) / q00
+        p0 += diff
+        pqp = (pqp + diff * (diff * q00 + 2 * qp0)) / (1 + diff) / (1 + diff)
+        qp1 = (qp1 + diff * q01) / (1 + diff)
+        p0 /= 1 + diff
+        p1 /= 1 + diff
+
+        diff = (-qp1 + pqp) / q11
+        p1 += diff
+        p0 /= 1 + diff
+        p1 /= 1 + diff
+    return p0, p1
+
+
+def _pairwise_coupling(r, max_iter=100, eps=0.005 / 2):
+    # Same iteration as _pairwise_coupling_row, run on every row at once
+    if r.size <= 16:
+        return np.array([_pairwise_coupling_row(x, max_iter, eps) for x in r.tolist()]).reshape(-1, 2)
+
+    q00 = (1 - r) * (1 - r)
+    q11 = r * r
+    q01 = -(1 - r) * r
+    p0 = np.full_like(r, 0.5)
+    p1 = np.full_like(r, 0.5)
+
+    rows = np.arange(r.size)
+    for _ in range(max_iter):
+        a0, a1 = p0[rows], p1[rows]
+        b00, b11, b01 = q00[rows], q11[rows], q01[rows]
+        qp0 = b00 * a0 + b01 * a1
+        qp1 = b01 * a0 + b11 * a1
+        pqp = a0 * qp0 + a1 * qp1
+
+        # Rows that already meet the stopping condition keep their values
+        active = np.maximum(np.abs(qp0 - pqp), np.abs(qp1 - pqp)) >= eps
+        if not active.any():
+            break
+        rows = rows[active]
+        a0, a1, b00, b11, b01 = a0[active], a1[active], b00[active], b11[active], b01[active]
+        qp0, qp1, pqp = qp0[active], qp1[active], pqp[active]
+
+        diff = (-qp0 + pqp) / b00
+        a0 = a0 + diff
+        pqp = (pqp + diff * (diff * b00 + 2 * qp0)) / (1 + diff) / (1 + diff)
+        qp1 = (qp1 + diff * b01) / (1 + diff)
+        a0 = a0 / (1 + diff)
+        a1 = a1 / (1 + diff)
+
+        diff = (-qp1 + pqp) / b11
+        a1 = a1 + diff
+        a0 = a0 / (1 + diff)
+        a1 = a1 / (1 + diff)
+
+        p0[rows] = a0
+        p1[rows] = a1
+    return np.column_stack([p0, p1])
+
+
+def platt_probabilities(decision, prob_a, prob_b):
+    # decision uses libsvm's sign convention (positive -> first class)
+    r = _sigmoid_predict(decision, prob_a, prob_b)
+    r = np.minimum(np.maximum(r, 1e-7), 1 - 1e-7)
+    return _pairwise_coupling(r)
+
+
+def write_artifact(path, arrays, meta):
+    # Layout: magic, uint32 header length, JSON header, then each array as
+    # raw little-endian bytes starting on a 64-byte boundary
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype='<f8')
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entries[name] = {'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'meta': meta, 'arrays': entries}).encode()
+
+    # Other processes keep the current file memory-mapped, and truncating
+    # it under them kills them with SIGBUS. The new artifact is written
+    # under a temporary name and renamed over the old one, which leaves
+    # existing mappings on the old inode.
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGNMENT) * ALIGNMENT
+    try:
+        with open(path + '.tmp', 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + entries[name]['offset'])
+                f.write(np.ascontiguousarray(array, dtype='<f8').tobytes())
+    except Exception:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    os.replace(path + '.tmp', path)
+
+
+def read_artifact(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a compact model artifact")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len))
+
+    # Read-only mapping: every process scoring with the same file shares
+    # one copy of the support vectors through the page cache
+    data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGNMENT) * ALIGNMENT
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        count = int(np.prod(entry['shape']))
+        arrays[name] = np.frombuffer(mapped, dtype='<f8', count=count,
+                                     offset=data_start + entry['offset']).reshape(entry['shape'])
+    return arrays, header['meta']
+
+
+class CompactPredictor:
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.feature_columns = meta['feature_columns']
+        self.classes = np.array(meta['classes'])
+        self.gamma = meta['gamma']
+        self.prob_a = meta['prob_a']
+        self.prob_b = meta['prob_b']
+        self.intercept = meta['intercept']
+        self.mean = arrays['scaler_mean']
+        self.scale = arrays['scaler_scale']
+        self.support_vectors = arrays['support_vectors']
+        self.dual_coef = arrays['dual_coef']
+        self._sv_sq_norms = np.einsum('ij,ij->i', self.support_vectors, self.support_vectors)
+
+    @classmethod
+    def load(cls, path=ARTIFACT_PATH):
+        return cls(*read_artifact(path))
+
+    @property
+    def version(self):
+        return self.meta.get('version')
+
+    def decision_function(self, features_scaled):
+        # RBF kernel against the support vectors, libsvm sign convention
+        x_sq = np.einsum('ij,ij->i', features_scaled, features_scaled)
+        sq_dist = x_sq[:, None] + self._sv_sq_norms[None, :] - 2.0 * features_scaled @ self.support_vectors.T
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        np.exp(-self.gamma * sq_dist, out=sq_dist)
+        return sq_dist @ self.dual_coef + self.intercept
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != len(self.feature_columns):
+            raise ValueError(f"Expected {len(self.feature_columns)} features, got {features.shape[1]}")
+        check_finite(features)
+
+        # Score in blocks so the kernel matrix stays small for large inputs.
+        # Stage times go to telemetry in one call at the end; this path is
+        # short enough that a context manager per stage would show up.
+        decision = np.empty(len(features))
+        scale_seconds = decision_seconds = 0.0
+        for start in range(0, len(features), BLOCK_ROWS):
+            t0 = time.perf_counter()
+            block = (features[start:start + BLOCK_ROWS] - self.mean) / self.scale
+            t1 = time.perf_counter()
+            decision[start:start + BLOCK_ROWS] = self.decision_function(block)
+            t2 = time.perf_counter()
+            scale_seconds += t1 - t0
+            decision_seconds += t2 - t1
+
+        prediction = self.classes[np.where(decision > 0, 0, 1)]
+        t0 = time.perf_counter()
+        probabilities = platt_probabilities(decision, self.prob_a, self.prob_b)
+        telemetry.record_predictions(prediction, {
+            'scale': scale_seconds,
+            'decision': decision_seconds,
+            'calibrate': time.perf_counter() - t0,
+        })
+        return prediction, probabilities
+
+
+def pickle_version(model_path='breast_cancer.pkl', scaler_path='scaler.pkl'):
+    # Same content hash the registry and export_artifact.py use
+    digest = hashlib.sha256()
+    for path in (model_path, scaler_path):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def load_predictor(artifact_path=ARTIFACT_PATH, model_path='breast_cancer.pkl', scaler_path='scaler.pkl'):
+    # Prefer the compact artifact; only fall back to the pickles (and with
+    # them sklearn and pandas) when it is missing or was exported from
+    # different pickles than the ones on disk
+    try:
+        predictor = CompactPredictor.load(artifact_path)
+    except FileNotFoundError:
+        predictor = None
+    if predictor is not None:
+        if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+            return predictor
+        if predictor.version == pickle_version(model_path, scaler_path):
+            return predictor
+
+    from inference import PickledPredictor
+    return PickledPredictor.load(model_path, scaler_path)
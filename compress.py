@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn import metrics
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from compact_model import CompactPredictor, platt_probabilities, write_artifact
+from export_artifact import artifact_contents
+from train import DATA_PATH, RANDOM_STATE, load_split, load_version
+
+# Faster stand-ins for the trained RBF SVC, whose scoring cost grows with
+# the number of support vectors. A variant is accepted only if held-out
+# accuracy, malignant recall and AUC each drop by at most the tolerance.
+
+DEFAULT_TOLERANCE = 0.01
+GATED_METRICS = ('test_accuracy', 'test_recall', 'test_auc')
+# Share of the support vectors kept by each reduced-set variant
+SV_FRACTIONS = (0.5, 0.25, 0.1)
+# Feature-map sizes for the kernel approximations. They only pay off when
+# smaller than (Nystroem) or comparable to (random Fourier features) the
+# number of support vectors.
+NYSTROEM_COMPONENTS = (8, 16, 32)
+RFF_COMPONENTS = (16, 32, 64)
+# Rows per timed batch when measuring throughput
+BENCH_ROWS = 20000
+
+
+def rbf_kernel(X, centers, gamma):
+    sq_dist = (np.einsum('ij,ij->i', X, X)[:, None] + np.einsum('ij,ij->i', centers, centers)[None, :]
+               - 2.0 * X @ centers.T)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return np.exp(-gamma * sq_dist)
+
+
+def reduce_support_vectors(arrays, meta, X_train, n_keep):
+    # Reduced-set SVC: keep the n_keep support vectors with the largest
+    # |dual coefficient| and refit their coefficients and the intercept by
+    # least squares so the smaller expansion reproduces the full model's
+    # decision values on the training rows. The Platt parameters are kept,
+    # since the decision values they calibrate barely move.
+    full = CompactPredictor(arrays, meta)
+    target = full.decision_function(X_train)
+    keep = np.sort(np.argsort(-np.abs(full.dual_coef), kind='stable')[:n_keep])
+    support_vectors = full.support_vectors[keep]
+
+    design = np.column_stack([rbf_kernel(X_train, support_vectors, full.gamma), np.ones(len(X_train))])
+    coef = np.linalg.lstsq(design, target, rcond=None)[0]
+    reduced_arrays = {**arrays, 'support_vectors': support_vectors, 'dual_coef': coef[:-1]}
+    reduced_meta = {**meta, 'intercept': float(coef[-1])}
+    return reduced_arrays, reduced_meta
+
+
+def kernel_approximation(kind, n_components, gamma, C, X_train, y_train):
+    # Explicit feature map for the same RBF kernel, then a linear model
+    if kind == 'nystroem':
+        mapper = Nystroem(gamma=gamma, n_components=n_components, random_state=RANDOM_STATE)
+    else:
+        mapper = RBFSampler(gamma=gamma, n_components=n_components, random_state=RANDOM_STATE)
+    model = make_pipeline(mapper, LogisticRegression(C=C, max_iter=5000))
+    model.fit(X_train, y_train)
+    return model
+
+
+def svc_scorer(predictor):
+    # Scaled rows -> (prediction, malignant probability), as CompactPredictor
+    # scores them
+    def score(X):
+        decision = predictor.decision_function(X)
+        prediction = predictor.classes[np.where(decision > 0, 0, 1)]
+        return prediction, platt_probabilities(decision, predictor.prob_a, predictor.prob_b)[:, 1]
+    return score
+
+
+def pipeline_scorer(model):
+    def score(X):
+        proba = model.predict_proba(X)[:, 1]
+        return model.classes_[(proba > 0.5).astype(int)], proba
+    return score
+
+
+def held_out_metrics(score, X_test, y_test):
+    prediction, proba = score(X_test)
+    return {
+        'test_accuracy': float(metrics.accuracy_score(y_test, prediction)),
+        'test_recall': float(metrics.recall_score(y_test, prediction)),
+        'test_auc': float(metrics.roc_auc_score(y_test, proba)),
+    }
+
+
+def measure_speed(score, X_test, repeats=5):
+    batch = np.resize(X_test, (BENCH_ROWS, X_test.shape[1]))
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        score(batch)
+        best = min(best, time.perf_counter() - start)
+
+    single = []
+    for row in X_test[:200]:
+        start = time.perf_counter()
+        score(row[None, :])
+        single.append(time.perf_counter() - start)
+    return {'rows_per_second': BENCH_ROWS / best, 'single_row_us': float(np.median(single) * 1e6)}
+
+
+def compress_svc(model, scaler, feature_columns, X_train, y_train, X_test, y_test,
+                 tolerance=DEFAULT_TOLERANCE, output_dir=None):
+    arrays, meta = artifact_contents(model, scaler, feature_columns)
+    baseline_score = svc_scorer(CompactPredictor(arrays, meta))
+    baseline = {'name': 'svc', 'size': len(arrays['support_vectors']),
+                **held_out_metrics(baseline_score, X_test, y_test),
+                **measure_speed(baseline_score, X_test)}
+
+    # name -> (kind, size, score, (writer, suffix))
+    candidates = {}
+    n_sv = len(arrays['support_vectors'])
+    for fraction in SV_FRACTIONS:
+        n_keep = max(1, int(round(fraction * n_sv)))
+        reduced = reduce_support_vectors(arrays, meta, X_train, n_keep)
+        candidates[f'svc-reduced-{n_keep}'] = (
+            'reduced', n_keep, svc_scorer(CompactPredictor(*reduced)),
+            (lambda path, reduced=reduced: write_artifact(path, *reduced), '.bin'))
+    for kind, sizes in (('nystroem', NYSTROEM_COMPONENTS), ('rff', RFF_COMPONENTS)):
+        for n_components in sizes:
+            approx = kernel_approximation(kind, n_components, float(model._gamma), model.C, X_train, y_train)
+            candidates[f'{kind}-{n_components}'] = (
+                kind, n_components, pipeline_scorer(approx),
+                (lambda path, approx=approx: _pickle(approx, path), '.pkl'))
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    variants = []
+    for name, (kind, size, score, (write, suffix)) in candidates.items():
+        result = {'name': name, 'kind': kind, 'size': size,
+                  **held_out_metrics(score, X_test, y_test), **measure_speed(score, X_test)}
+        result['accepted'] = all(baseline[m] - result[m] <= tolerance for m in GATED_METRICS)
+        result['speedup'] = result['rows_per_second'] / baseline['rows_per_second']
+        if output_dir:
+            result['path'] = os.path.join(output_dir, name + suffix)
+            write(result['path'])
+        variants.append(result)
+    return {'tolerance': tolerance, 'baseline': baseline, 'variants': variants}
+
+
+def _pickle(obj, path):
+    with open(path, 'wb') as f:
+        pickle.dump(obj, f)
+
+
+def compress_version(version_dir, data_path=DATA_PATH, tolerance=DEFAULT_TOLERANCE):
+    model, scaler, features = load_version(version_dir, 'svc')
+    X_train, X_test, y_train, y_test = load_split(version_dir, data_path)
+
+    report = compress_svc(model, scaler, features, X_train, y_train, X_test, y_test,
+                          tolerance, os.path.join(version_dir, 'compressed'))
+    with open(os.path.join(version_dir, 'compression.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def print_report(report):
+    print(f"{'variant':<18} {'size':>5} {'acc':>7} {'recall':>7} {'auc':>7} "
+          f"{'rows/s':>12} {'1 row us':>9} {'speedup':>8}  gate (tolerance {report['tolerance']})")
+    for r in [report['baseline']] + report['variants']:
+        gate = '' if r is report['baseline'] else ('accepted' if r['accepted'] else 'rejected')
+        speedup = r.get('speedup', 1.0)
+        print(f"{r['name']:<18} {r['size']:>5} {r['test_accuracy']:>7.4f} {r['test_recall']:>7.4f} "
+              f"{r['test_auc']:>7.4f} {r['rows_per_second']:>12,.0f} {r['single_row_us']:>9.1f} "
+              f"{speedup:>7.2f}x  {gate}")
+    print("speedup is batch throughput; single-row times of the kernel approximations include "
+          "sklearn's per-call validation")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress a trained version's SVC and gate the variants")
+    parser.add_argument('version_dir', help='train.py output directory with an svc model')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='largest allowed drop in held-out accuracy, recall and AUC')
+    args = parser.parse_args()
+
+    print_report(compress_version(args.version_dir, args.data, args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
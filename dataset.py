@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from inference import FEATURE_COLUMNS, ID_COLUMN, LABEL_COLUMN
+
+# Binary columnar cache of data1.csv-shaped files. The CSV is parsed once
+# into .npy files (float64 features, int8 labels, int64 ids) that are
+# memory-mapped on every later load. The cache records the source file's
+# size, mtime and SHA-256 and is rebuilt when the CSV changes.
+
+CACHE_DIR = '.dataset_cache'
+CACHE_FORMAT = 1
+BUILD_CHUNK_ROWS = 50000
+# Encoded labels; rows without a diagnosis are -1
+LABELS = {'M': 1, 'B': 0}
+MISSING_LABEL = -1
+
+# labels / ids are None when the CSV has no diagnosis / id column
+Dataset = namedtuple('Dataset', ['features', 'labels', 'ids', 'columns'])
+
+
+def cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR, os.path.basename(path))
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_rows(path):
+    # Data lines in a CSV (minus the header) without parsing it, so build()
+    # can size the cache arrays and bulk mode can show progress before
+    # scoring starts
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory, meta):
+    with open(os.path.join(directory, 'meta.json.tmp'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(os.path.join(directory, 'meta.json.tmp'), os.path.join(directory, 'meta.json'))
+
+
+def is_current(path, meta):
+    # Size and mtime are checked first; the checksum is only recomputed
+    # when they moved, so a touched but unchanged CSV keeps its cache. The
+    # new stamp is then saved, so later loads take the fast path again.
+    if meta is None or meta.get('format') != CACHE_FORMAT:
+        return False
+    stamp = _stamp(path)
+    if stamp == meta['source']['stamp']:
+        return True
+    if stamp['size'] != meta['source']['stamp']['size']:
+        return False
+    if file_checksum(path) != meta['source']['sha256']:
+        return False
+    meta['source']['stamp'] = stamp
+    try:
+        _write_meta(cache_dir(path), meta)
+    except OSError:
+        pass
+    return True
+
+
+def build(path):
+    # Parse the CSV in chunks straight into preallocated .npy files, so
+    # building needs no more memory than one chunk. Only the feature, id
+    # and diagnosis columns are read; the trailing-comma 'Unnamed: 32'
+    # column never is.
+    directory = cache_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [col for col in FEATURE_COLUMNS if col in header]
+    wanted = set(columns) | {ID_COLUMN, LABEL_COLUMN}
+    n = count_rows(path)
+    stamp = _stamp(path)
+    checksum = file_checksum(path)
+
+    # Written under temporary names and renamed; meta.json goes last and
+    # is what marks the cache as complete
+    tmp = {name: os.path.join(directory, f'{name}.npy.tmp') for name in ('features', 'labels', 'ids')}
+    try:
+        features = np.lib.format.open_memmap(tmp['features'], mode='w+', dtype=np.float64, shape=(n, len(columns)))
+        labels = np.lib.format.open_memmap(tmp['labels'], mode='w+', dtype=np.int8, shape=(n,))
+        ids = np.lib.format.open_memmap(tmp['ids'], mode='w+', dtype=np.int64, shape=(n,))
+        start = 0
+        for chunk in pd.read_csv(path, usecols=lambda col: col in wanted, chunksize=BUILD_CHUNK_ROWS):
+            stop = start + len(chunk)
+            features[start:stop] = chunk[columns].to_numpy(dtype=np.float64)
+            if LABEL_COLUMN in chunk.columns:
+                labels[start:stop] = chunk[LABEL_COLUMN].map(LABELS).fillna(MISSING_LABEL).to_numpy(dtype=np.int8)
+            else:
+                labels[start:stop] = MISSING_LABEL
+            ids[start:stop] = chunk[ID_COLUMN].to_numpy(dtype=np.int64) if ID_COLUMN in chunk.columns else 0
+            start = stop
+        for array in (features, labels, ids):
+            array.flush()
+        del features, labels, ids
+        if start != n:
+            raise ValueError(f"{path}: counted {n} rows but parsed {start}")
+    except Exception:
+        for tmp_path in tmp.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    for name, tmp_path in tmp.items():
+        os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+    meta = {
+        'format': CACHE_FORMAT,
+        'source': {'path': os.path.abspath(path), 'stamp': stamp, 'sha256': checksum},
+        'rows': n,
+        'columns': columns,
+        'has_labels': LABEL_COLUMN in header,
+        'has_ids': ID_COLUMN in header,
+    }
+    _write_meta(directory, meta)
+    return meta
+
+
+def load(path):
+    # Memory-mapped (read-only) arrays; builds or rebuilds the cache first
+    # if the CSV is new or has changed
+    directory = cache_dir(path)
+    meta = _read_meta(directory)
+    if not is_current(path, meta):
+        meta = build(path)
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+              for name in ('features', 'labels', 'ids')}
+    return Dataset(arrays['features'], arrays['labels'] if meta['has_labels'] else None,
+                   arrays['ids'] if meta['has_ids'] else None, meta['columns'])
+
+
+def select(dataset, columns, rows=slice(None)):
+    # Feature matrix restricted to `columns`, in that order. Slicing `rows`
+    # first keeps chunked readers from pulling the whole file into memory.
+    missing = [col for col in columns if col not in dataset.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {', '.join(missing)}")
+    features = dataset.features[rows]
+    if list(columns) == dataset.columns:
+        return features
+    return features[:, [dataset.columns.index(col) for col in columns]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the columnar cache of a CSV and compare load times')
+    parser.add_argument('path', nargs='?', default='data1.csv')
+    parser.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+
+    if args.rebuild:
+        start = time.perf_counter()
+        build(args.path)
+        print(f"Built {cache_dir(args.path)} in {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    dataset = load(args.path)
+    X = np.asarray(dataset.features)
+    X.sum()  # touch every page, so the comparison includes the reads
+    cached = time.perf_counter() - start
+    start = time.perf_counter()
+    pd.read_csv(args.path)
+    parsed = time.perf_counter() - start
+    print(f"{X.shape[0]} rows x {X.shape[1]} features: cache {cached * 1000:.1f} ms, "
+          f"pd.read_csv {parsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn import metrics
+
+from train import DATA_PATH, RANDOM_STATE, load_split, load_version
+
+# Scores every model of a train.py version on its test split once, caches
+# the labels and probabilities next to the models, and derives all curves,
+# metrics and bootstrap intervals from that cache.
+
+PREDICTIONS_FILE = 'predictions.npz'
+# Legend/axis names used in project.ipynb, in its plotting order
+FAMILY_LABELS = {'lr': 'LR', 'dt': 'DT', 'svc': 'SVM', 'knn': 'KNN', 'xgb': 'XGBoost', 'rf': 'RF', 'gbdt': 'GBDT'}
+DEFAULT_BOOTSTRAP = 2000
+# Replicates per parallel task; each task draws from its own seed so the
+# intervals do not depend on the number of workers
+BOOTSTRAP_CHUNK = 250
+CI_LEVEL = 0.95
+ROC_FIGURE = 'roc_breast_cancer.jpeg'
+PE_FIGURE = 'PE_breast_cancer.jpeg'
+
+
+def _families(version_dir):
+    found = {name[:-len('.pkl')] for name in os.listdir(os.path.join(version_dir, 'models'))}
+    return [f for f in FAMILY_LABELS if f in found]
+
+
+def _cache_key(version_dir, families, y_test):
+    # Changes whenever a model file or the test labels change
+    digest = hashlib.sha256(np.ascontiguousarray(y_test).tobytes())
+    for family in families:
+        with open(os.path.join(version_dir, 'models', f'{family}.pkl'), 'rb') as f:
+            digest.update(family.encode() + f.read())
+    return digest.hexdigest()
+
+
+def cached_predictions(version_dir, data_path=DATA_PATH):
+    # {family: (labels, malignant probability)} on the test split, plus the
+    # test labels. Computed once per version and then read from the cache.
+    _, X_test, _, y_test = load_split(version_dir, data_path)
+    families = _families(version_dir)
+    key = _cache_key(version_dir, families, y_test)
+    path = os.path.join(version_dir, PREDICTIONS_FILE)
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            if str(cached['key']) == key:
+                return y_test, {f: (cached[f'{f}_pred'], cached[f'{f}_proba']) for f in families}, True
+
+    scored = {}
+    for family in families:
+        model, _, _ = load_version(version_dir, family)
+        proba = model.predict_proba(X_test)[:, list(model.classes_).index(1)]
+        scored[family] = (np.asarray(model.predict(X_test)), proba)
+    arrays = {f'{f}_{kind}': value for f, (pred, proba) in scored.items()
+              for kind, value in (('pred', pred), ('proba', proba))}
+    np.savez(path, key=key, **arrays)
+    return y_test, scored, False
+
+
+def bootstrap_counts(rng, n_replicates, n):
+    # How often each row is drawn in each replicate, as a (replicates, n)
+    # matrix, so every metric below is a matrix product
+    draws = rng.integers(0, n, (n_replicates, n))
+    offsets = (np.arange(n_replicates) * n)[:, None]
+    return np.bincount((draws + offsets).ravel(), minlength=n_replicates * n).reshape(n_replicates, n)
+
+
+def weighted_auc(counts, y, proba):
+    # ROC AUC for every row of counts at once: positives score the weight
+    # of negatives ranked below them, plus half the ties
+    _, group = np.unique(proba, return_inverse=True)
+    onehot = np.zeros((len(y), group.max() + 1))
+    onehot[np.arange(len(y)), group] = 1.0
+    positive = y == 1
+    pos = counts[:, positive] @ onehot[positive]
+    neg = counts[:, ~positive] @ onehot[~positive]
+    neg_below = np.cumsum(neg, axis=1) - neg
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (pos * (neg_below + 0.5 * neg)).sum(axis=1) / (pos.sum(axis=1) * neg.sum(axis=1))
+
+
+def _bootstrap_chunk(y, pred, proba, n_replicates, seed):
+    counts = bootstrap_counts(np.random.default_rng(seed), n_replicates, len(y)).astype(np.float64)
+    correct = (pred == y).astype(np.float64)
+    positive = (y == 1).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        recall = counts @ (correct * positive) / (counts @ positive)
+    return np.column_stack([counts @ correct / len(y), recall, weighted_auc(counts, y, proba)])
+
+
+def bootstrap_intervals(y, pred, proba, n_replicates=DEFAULT_BOOTSTRAP, n_jobs=-1, seed=RANDOM_STATE):
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_replicates // BOOTSTRAP_CHUNK))
+    sizes = [min(BOOTSTRAP_CHUNK, n_replicates - i * BOOTSTRAP_CHUNK) for i in range(len(seeds))]
+    chunks = Parallel(n_jobs=n_jobs)(delayed(_bootstrap_chunk)(y, pred, proba, size, s)
+                                     for size, s in zip(sizes, seeds))
+    samples = np.vstack(chunks)
+    tail = (1 - CI_LEVEL) / 2 * 100
+    low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return {name: [float(low[i]), float(high[i])] for i, name in enumerate(('accuracy', 'recall', 'auc'))}
+
+
+def evaluate_version(version_dir, data_path=DATA_PATH, n_replicates=DEFAULT_BOOTSTRAP, n_jobs=-1):
+    y, scored, cached = cached_predictions(version_dir, data_path)
+    report, curves = {}, {}
+    for family, (pred, proba) in scored.items():
+        fpr, tpr, _ = metrics.roc_curve(y, proba)
+        precision, recall, _ = metrics.precision_recall_curve(y, proba)
+        curves[family] = {'roc': (fpr, tpr), 'pr': (recall, precision)}
+        report[family] = {
+            'accuracy': float(metrics.accuracy_score(y, pred)),
+            'recall': float(metrics.recall_score(y, pred)),
+            # From probabilities, not hard labels as the notebook did
+            'auc': float(metrics.roc_auc_score(y, proba)),
+            'average_precision': float(metrics.average_precision_score(y, proba)),
+            'confusion_matrix': metrics.confusion_matrix(y, pred).tolist(),
+            'ci': bootstrap_intervals(y, pred, proba, n_replicates, n_jobs),
+        }
+    return report, curves, cached
+
+
+def render(report, curves, output_dir='.'):
+    # Both notebook figures, each drawn and saved exactly once
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    families = list(report)
+    labels = [FAMILY_LABELS[f] for f in families]
+
+    plt.figure(figsize=(8, 5))
+    for family, label in zip(families, labels):
+        fpr, tpr = curves[family]['roc']
+        plt.plot(fpr, tpr, label='%s -ROC(area = %0.2f)' % (label, report[family]['auc']))
+    plt.plot([0, 1], [0, 1], 'r--')
+    plt.xlim([-0.01, 0.1])
+    plt.ylim([0.0, 1.05])
+    plt.xlabel('1 - Specificity (False Positive Rate)', fontsize=12)
+    plt.ylabel('Sensitivity (True Positive Rate)', fontsize=12)
+    plt.title('ROC - Breast Cancer Prediction ', fontsize=12)
+    plt.legend(loc="lower right", fontsize=12)
+    plt.savefig(os.path.join(output_dir, ROC_FIGURE), format='jpeg', dpi=400, bbox_inches='tight')
+    plt.close()
+
+    # Test accuracy and AUC with their bootstrap intervals
+    index = np.arange(len(families))
+    bar_width = 0.35
+    plt.figure(figsize=(8, 5))
+    for offset, metric, color, name in ((0, 'accuracy', 'mediumpurple', 'Accuracy (%)'),
+                                        (bar_width, 'auc', 'rebeccapurple', 'ROC (%)')):
+        values = np.array([report[f][metric] for f in families]) * 100
+        ci = np.array([report[f]['ci'][metric] for f in families]).T * 100
+        plt.bar(index + offset, values, bar_width, alpha=0.8, color=color, label=name,
+                yerr=[values - ci[0], ci[1] - values], capsize=3)
+    plt.xlim([-1, 8])
+    plt.ylim([70, 104])
+    plt.title('Performance Evaluation - Breast Cancer Prediction', fontsize=12)
+    plt.xticks(index + bar_width / 2, labels, rotation=40)
+    plt.legend(loc="lower right", fontsize=10)
+    plt.tight_layout()
+    plt.savefig(os.path.join(output_dir, PE_FIGURE), format='jpeg', dpi=400, bbox_inches='tight')
+    plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a train.py version's models on its test split")
+    parser.add_argument('version_dir')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--bootstrap', type=int, default=DEFAULT_BOOTSTRAP, help='bootstrap replicates per model')
+    parser.add_argument('--jobs', type=int, default=-1,
+                        help='worker processes for the bootstrap (default: one per core)')
+    parser.add_argument('--figures', default='.', help=f'directory to write {ROC_FIGURE} and {PE_FIGURE} to')
+    parser.add_argument('--no-figures', action='store_true')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report, curves, cached = evaluate_version(args.version_dir, args.data, args.bootstrap, args.jobs)
+    with open(os.path.join(args.version_dir, 'evaluation.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    if not args.no_figures:
+        render(report, curves, args.figures)
+
+    level = f"{CI_LEVEL:.0%}"
+    print(f"{'model':<8} {'accuracy':>22} {'recall':>22} {'auc':>22} {'ap':>6}  confusion")
+    for family, r in report.items():
+        cells = [f"{r[m]:.3f} [{r['ci'][m][0]:.3f}, {r['ci'][m][1]:.3f}]" for m in ('accuracy', 'recall', 'auc')]
+        print(f"{FAMILY_LABELS[family]:<8} {cells[0]:>22} {cells[1]:>22} {cells[2]:>22} "
+              f"{r['average_precision']:>6.3f}  {r['confusion_matrix']}")
+    source = 'cached' if cached else 'computed'
+    print(f"{level} intervals from {args.bootstrap} bootstrap replicates; predictions {source}; "
+          f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
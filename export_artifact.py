@@ -0,0 +1,50 @@
+import argparse
+
+from compact_model import ARTIFACT_PATH, pickle_version, write_artifact
+from inference import MODEL_PATH, SCALER_PATH, load_model, model_columns
+
+
+def artifact_contents(model, scaler, feature_columns=None, version=None):
+    if getattr(model, 'kernel', None) != 'rbf' or not model.probability or len(model.classes_) != 2:
+        raise ValueError("Only binary RBF SVC models with probability=True can be exported")
+
+    # Internal (libsvm sign) coefficients, so the compact predictor computes
+    # exactly the decision values libsvm does
+    arrays = {
+        'support_vectors': model.support_vectors_,
+        'dual_coef': model._dual_coef_[0],
+        'scaler_mean': scaler.mean_,
+        'scaler_scale': scaler.scale_,
+    }
+    meta = {
+        'kernel': 'rbf',
+        'gamma': float(model._gamma),
+        'intercept': float(model._intercept_[0]),
+        'prob_a': float(model._probA[0]),
+        'prob_b': float(model._probB[0]),
+        'classes': [int(c) for c in model.classes_],
+        # The inputs the artifact needs, in order
+        'feature_columns': list(feature_columns or model_columns(scaler)),
+        'version': version,
+    }
+    return arrays, meta
+
+
+def export(model, scaler, output_path, feature_columns=None, version=None):
+    write_artifact(output_path, *artifact_contents(model, scaler, feature_columns, version))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the pickled SVC and scaler to a compact artifact')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--output', default=ARTIFACT_PATH)
+    args = parser.parse_args()
+
+    model, scaler = load_model(args.model, args.scaler)
+    export(model, scaler, args.output, version=pickle_version(args.model, args.scaler))
+    print(f"Wrote {args.output} ({model.support_vectors_.shape[0]} support vectors)")
+
+
+if __name__ == '__main__':
+    main()
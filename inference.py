@@ -0,0 +1,150 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from compact_model import check_finite, platt_probabilities
+from telemetry import telemetry
+
+MODEL_PATH = 'breast_cancer.pkl'
+SCALER_PATH = 'scaler.pkl'
+
+# All measurement columns of data1.csv, in file order. A trained scaler
+# may use a subset (see model_columns)
+FEATURE_COLUMNS = [
+    'radius_mean', 'texture_mean', 'perimeter_mean', 'area_mean',
+    'smoothness_mean', 'compactness_mean', 'concavity_mean',
+    'concave points_mean', 'symmetry_mean', 'fractal_dimension_mean',
+    'radius_se', 'texture_se', 'perimeter_se', 'area_se',
+    'smoothness_se', 'compactness_se', 'concavity_se',
+    'concave points_se', 'symmetry_se', 'fractal_dimension_se',
+    'radius_worst', 'texture_worst', 'perimeter_worst', 'area_worst',
+    'smoothness_worst', 'compactness_worst', 'concavity_worst',
+    'concave points_worst', 'symmetry_worst', 'fractal_dimension_worst',
+]
+
+# Columns data1.csv carries besides the features
+ID_COLUMN = 'id'
+LABEL_COLUMN = 'diagnosis'
+
+
+def load_model(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    return model, scaler
+
+
+def model_columns(scaler):
+    # Columns the scaler (and so the model) was fitted on, in order. Older
+    # scalers fitted on bare arrays carry no names and use all 30.
+    names = getattr(scaler, 'feature_names_in_', None)
+    return FEATURE_COLUMNS if names is None else [str(name) for name in names]
+
+
+def feature_frame(df, columns=FEATURE_COLUMNS):
+    # Pick the model columns in training order, ignoring id, diagnosis and
+    # the empty 'Unnamed: 32' column produced by the trailing comma
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing feature columns: {', '.join(missing)}")
+    return df[columns].astype(np.float64)
+
+
+def _libsvm_decision(model, features_scaled):
+    # The same libsvm call SVC.decision_function ends in, minus sklearn's
+    # per-call input validation, which costs more than the kernel itself
+    # for a single row against a few dozen support vectors
+    from sklearn.svm import _libsvm as libsvm
+
+    X = np.ascontiguousarray(features_scaled, dtype=np.float64)
+    if X.ndim != 2 or X.shape[1] != model.support_vectors_.shape[1]:
+        raise ValueError(f"Expected {model.support_vectors_.shape[1]} features, got {X.shape[-1]}")
+    check_finite(X)
+    dec = libsvm.decision_function(
+        X,
+        model.support_,
+        model.support_vectors_,
+        model._n_support,
+        model._dual_coef_,
+        model._intercept_,
+        model._probA,
+        model._probB,
+        svm_type=0,
+        kernel=model.kernel,
+        degree=model.degree,
+        cache_size=model.cache_size,
+        coef0=model.coef0,
+        gamma=model._gamma,
+    )
+    return dec.ravel()
+
+
+def predict_with_proba(model, features_scaled, stage_prefix=''):
+    # Label and probabilities from a single decision function evaluation, so
+    # the RBF kernel is computed against the support vectors once instead of
+    # once for predict() and again for predict_proba(). Callers scoring rows
+    # that are not predictions pass a stage_prefix, which keeps their
+    # timings out of the 'decision' and 'calibrate' stages.
+    fused = (getattr(model, '_impl', None) == 'c_svc' and isinstance(model.kernel, str)
+             and model.kernel != 'precomputed' and model.probability
+             and len(model.classes_) == 2 and not model.break_ties
+             and not model._sparse)
+    if not fused:
+        with telemetry.stage(stage_prefix + 'decision'):
+            return model.predict(features_scaled), model.predict_proba(features_scaled)
+
+    # libsvm's sign convention (sklearn flips it for decision_function)
+    with telemetry.stage(stage_prefix + 'decision'):
+        decision = _libsvm_decision(model, features_scaled)
+        prediction = model.classes_[np.where(decision > 0, 0, 1)]
+    with telemetry.stage(stage_prefix + 'calibrate'):
+        return prediction, platt_probabilities(decision, model._probA[0], model._probB[0])
+
+
+def predict_batch(model, scaler, features):
+    # One vectorized scaler and SVC call for the whole block of rows
+    with telemetry.stage('scale'):
+        features_scaled = scaler.transform(features)
+    prediction, probabilities = predict_with_proba(model, features_scaled)
+    telemetry.record_predictions(prediction)
+    return prediction, probabilities
+
+
+class PickledPredictor:
+    # Same predict() interface as compact_model.CompactPredictor, backed by
+    # the pickled sklearn scaler and SVC
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+
+    @classmethod
+    def load(cls, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+        return cls(*load_model(model_path, scaler_path))
+
+    @property
+    def feature_columns(self):
+        return model_columns(self.scaler)
+
+    @property
+    def mean(self):
+        return self.scaler.mean_
+
+    @property
+    def scale(self):
+        return self.scaler.scale_
+
+    def predict(self, features):
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        return predict_batch(self.model, self.scaler, pd.DataFrame(features, columns=self.feature_columns))
+
+
+def results_frame(prediction, probabilities, index=None):
+    return pd.DataFrame({
+        'prediction': prediction,
+        'benign_probability': probabilities[:, 0],
+        'malignant_probability': probabilities[:, 1],
+    }, index=index)
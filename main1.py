@@ -1,7 +1,93 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import math
 import numpy as np
-import pickle
+import queue
+import threading
+import time
+
+from compact_model import load_predictor
+from telemetry import telemetry
+
+# How often the Tk loop checks for results from the worker thread
+POLL_MS = 50
+# Rows per chunk in bulk mode; each chunk is one predict() call and one
+# progress update
+BULK_CHUNK_SIZE = 2000
+# The table only shows this many rows; "Save Results" writes all of them
+MAX_TABLE_ROWS = 5000
+TABLE_COLUMNS = ('id', 'diagnosis', 'prediction', 'benign_probability', 'malignant_probability')
+# Similar labeled cases shown under a prediction
+NEIGHBORS_K = 5
+
+class BulkResultsWindow:
+    def __init__(self, parent, path, on_cancel, on_save):
+        self.window = tk.Toplevel(parent)
+        self.window.title(f"Bulk Scoring - {path}")
+        self.window.geometry("900x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.on_cancel = on_cancel
+        self.running = True
+        self.shown = 0
+
+        self.status = tk.StringVar(value="Counting rows...")
+        ttk.Label(self.window, textvariable=self.status).pack(padx=10, pady=(10, 5), anchor='w')
+        self.progress = ttk.Progressbar(self.window, mode='determinate')
+        self.progress.pack(padx=10, fill='x')
+
+        buttons = ttk.Frame(self.window)
+        buttons.pack(pady=5)
+        self.cancel_btn = ttk.Button(buttons, text="Cancel", command=on_cancel)
+        self.cancel_btn.grid(row=0, column=0, padx=5)
+        self.save_btn = ttk.Button(buttons, text="Save Results...", command=on_save, state='disabled')
+        self.save_btn.grid(row=0, column=1, padx=5)
+
+        table_frame = ttk.Frame(self.window)
+        table_frame.pack(padx=10, pady=(0, 10), fill='both', expand=True)
+        self.table = ttk.Treeview(table_frame, columns=TABLE_COLUMNS, show='headings')
+        for column in TABLE_COLUMNS:
+            self.table.heading(column, text=column.replace('_', ' ').title())
+            self.table.column(column, width=150, anchor='center')
+        scrollbar = ttk.Scrollbar(table_frame, orient='vertical', command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        self.table.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+    def exists(self):
+        return bool(self.window.winfo_exists())
+
+    def start(self, total):
+        self.progress.configure(maximum=max(total, 1))
+        self.status.set(f"Scoring 0 of {total} rows...")
+
+    def add_chunk(self, out, done, total):
+        self.progress.configure(value=done)
+        self.status.set(f"Scoring {done} of {total} rows...")
+        for row in out.head(MAX_TABLE_ROWS - self.shown).to_dict('records'):
+            self.table.insert('', 'end', values=(
+                row.get('id', ''), row.get('diagnosis', ''),
+                'MALIGNANT' if row['prediction'] == 1 else 'BENIGN',
+                f"{row['benign_probability']:.2%}", f"{row['malignant_probability']:.2%}"))
+            self.shown += 1
+
+    def finish(self, done, total, cancelled, malignant):
+        self.running = False
+        self.cancel_btn.configure(state='disabled')
+        if done:
+            self.save_btn.configure(state='normal')
+        state = "Cancelled after" if cancelled else "Scored"
+        note = f" (showing first {self.shown})" if self.shown < done else ""
+        self.status.set(f"{state} {done} of {total} rows, {malignant} malignant{note}")
+
+    def fail(self, message):
+        self.running = False
+        self.cancel_btn.configure(state='disabled')
+        self.status.set(f"Failed: {message}")
+
+    def close(self):
+        if self.running:
+            self.on_cancel()
+        self.window.destroy()
 
 class BreastCancerPredictor:
     def __init__(self, root):
@@ -10,12 +96,20 @@ class BreastCancerPredictor:
         self.root.geometry("1200x800")
         self.root.configure(bg='#FFC0CB')
 
-        # Load the model and scaler
-        try:
-            self.model = pickle.load(open('breast_cancer.pkl', 'rb'))
-            self.scaler = pickle.load(open('scaler.pkl', 'rb'))
-        except:
-            messagebox.showerror("Error", "Model files not found!")
+        # Model loading and every predict() call happen on a worker thread
+        # so the window never freezes. Jobs go in through self.jobs; results
+        # come back through self.results and are applied to the widgets by
+        # poll_results on the Tk main loop. Scoring and saving CSV files run
+        # on a second worker fed by self.bulk_jobs, so single predictions
+        # are not queued behind a whole file.
+        self.predictor = None
+        self.neighbors = None
+        self.jobs = queue.Queue()
+        self.bulk_jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.cancel_bulk = threading.Event()
+        self.bulk_window = None
+        self.bulk_frames = []
 
         # Sample values
         self.benign_sample = {
@@ -32,6 +126,13 @@ class BreastCancerPredictor:
 
         self.create_widgets()
 
+        # Load the model and scaler in the background (the compact artifact
+        # when exported, so sklearn and pandas are not imported at startup)
+        threading.Thread(target=self.worker, args=(self.jobs,), daemon=True).start()
+        threading.Thread(target=self.worker, args=(self.bulk_jobs,), daemon=True).start()
+        self.jobs.put(('load',))
+        self.root.after(POLL_MS, self.poll_results)
+
     def create_widgets(self):
         # Title
         title = tk.Label(self.root, text="TUMO TRACK", 
@@ -66,8 +167,11 @@ class BreastCancerPredictor:
         main_frame.grid_columnconfigure(1, weight=1, uniform='column')
         main_frame.grid_columnconfigure(2, weight=1, uniform='column')
 
-        # Create entry fields
+        # Create entry fields; entry_columns maps data1.csv column names to
+        # entry keys
         self.entries = {}
+        self.entry_labels = {}
+        self.entry_columns = {}
         self.create_entry_fields()
 
         # Create buttons frame
@@ -81,16 +185,19 @@ class BreastCancerPredictor:
                   command=self.load_malignant_sample).grid(row=0, column=1, padx=5)
         ttk.Button(buttons_frame, text="Clear All", 
                   command=self.clear_all).grid(row=0, column=2, padx=5)
+        self.bulk_btn = ttk.Button(buttons_frame, text="Score CSV File...",
+                                   command=self.score_file, state='disabled')
+        self.bulk_btn.grid(row=0, column=3, padx=5)
 
-        # Predict button
-        predict_btn = ttk.Button(self.root, text="PREDICT", command=self.predict)
-        predict_btn.pack(pady=5)
+        # Predict button (enabled once the model has loaded)
+        self.predict_btn = ttk.Button(self.root, text="PREDICT", command=self.predict, state='disabled')
+        self.predict_btn.pack(pady=5)
 
         # Results frame
         results_frame = ttk.LabelFrame(self.root, text="Prediction Results")
         results_frame.pack(padx=20, pady=5, fill='x')
 
-        self.result_text = tk.StringVar()
+        self.result_text = tk.StringVar(value="Loading model...")
         self.benign_prob = tk.StringVar()
         self.malignant_prob = tk.StringVar()
 
@@ -101,6 +208,10 @@ class BreastCancerPredictor:
         ttk.Label(results_frame, textvariable=self.malignant_prob, 
                  font=("Helvetica", 12)).pack(pady=2)
 
+        self.similar_cases = tk.StringVar()
+        ttk.Label(results_frame, textvariable=self.similar_cases,
+                 font=("Helvetica", 10), justify='left').pack(pady=2)
+
     def create_entry_fields(self):
         features = {
             'mean': ["Radius", "Texture", "Perimeter", "Area", "Smoothness",
@@ -126,10 +237,15 @@ class BreastCancerPredictor:
             frame.grid_columnconfigure(1, weight=1)
             
             for i, feature in enumerate(features[category]):
-                ttk.Label(frame, text=f"{feature}:").grid(row=i, column=0, padx=(20, 5), pady=2, sticky='e')
+                label = ttk.Label(frame, text=f"{feature}:")
+                label.grid(row=i, column=0, padx=(20, 5), pady=2, sticky='e')
                 entry = ttk.Entry(frame, width=15)
                 entry.grid(row=i, column=1, padx=(5, 20), pady=2)
-                self.entries[f"{category}_{feature.lower().replace(' ', '_')}"] = entry
+                key = f"{category}_{feature.lower().replace(' ', '_')}"
+                self.entries[key] = entry
+                self.entry_labels[key] = label
+                column = feature.lower().replace(' ', '_').replace('concave_points', 'concave points')
+                self.entry_columns[f"{column}_{category}"] = key
 
     def load_benign_sample(self):
         self.load_sample(self.benign_sample)
@@ -160,33 +276,171 @@ class BreastCancerPredictor:
 
     def predict(self):
         try:
-            # Collect input data
+            # Collect input data (widgets can only be read on the Tk thread)
+            assemble_start = time.perf_counter()
+            # Only the fields the loaded model uses, in its column order
             input_data = []
-            categories = ['mean', 'se', 'worst']
-            features = ["radius", "texture", "perimeter", "area", "smoothness",
-                       "compactness", "concavity", "concave_points", "symmetry", 
-                       "fractal_dimension"]
-            
-            for category in categories:
-                for feature in features:
-                    value = float(self.entries[f"{category}_{feature}"].get())
-                    input_data.append(value)
+            for column in self.predictor.feature_columns:
+                value = float(self.entries[self.entry_columns[column]].get())
+                # float() accepts 'nan' and 'inf'; the model does not
+                if not math.isfinite(value):
+                    raise ValueError(f"{column} is not a finite number")
+                input_data.append(value)
 
-            # Scale features and predict
             features = np.array(input_data).reshape(1, -1)
-            features_scaled = self.scaler.transform(features)
-            prediction = self.model.predict(features_scaled)
-            probabilities = self.model.predict_proba(features_scaled)
+            telemetry.observe_stage('assemble', time.perf_counter() - assemble_start)
+        except ValueError as e:
+            telemetry.record_error(e, 'main1')
+            messagebox.showerror("Error", "Please enter valid numeric values for all fields.")
+            return
+
+        # Scale features and predict on the worker
+        self.predict_btn.configure(state='disabled')
+        self.result_text.set("Predicting...")
+        self.benign_prob.set("")
+        self.malignant_prob.set("")
+        self.similar_cases.set("")
+        self.jobs.put(('predict', features))
+
+    def score_file(self):
+        path = filedialog.askopenfilename(title="Score CSV File",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        self.bulk_btn.configure(state='disabled')
+        self.cancel_bulk.clear()
+        self.bulk_frames = []
+        self.bulk_window = BulkResultsWindow(self.root, path, self.cancel_bulk.set, self.save_bulk_results)
+        self.bulk_jobs.put(('bulk', path))
 
-            # Display results
+    def save_bulk_results(self):
+        path = filedialog.asksaveasfilename(parent=self.bulk_window.window, defaultextension='.csv',
+                                            filetypes=[("CSV files", "*.csv")])
+        if path:
+            self.bulk_jobs.put(('save', path, list(self.bulk_frames)))
+
+    def worker(self, jobs):
+        # Runs on a background thread. Never touches Tk objects.
+        while True:
+            job, *args = jobs.get()
+            try:
+                if job == 'load':
+                    self.predictor = load_predictor()
+                    self.load_neighbors()
+                    self.results.put(('loaded',))
+                elif job == 'predict':
+                    prediction, probabilities = self.predictor.predict(args[0])
+                    cases = self.neighbors.neighbors(args[0], NEIGHBORS_K)[0] if self.neighbors else None
+                    self.results.put(('prediction', prediction, probabilities, cases))
+                elif job == 'bulk':
+                    self.run_bulk(args[0])
+                elif job == 'save':
+                    self.write_bulk_results(*args)
+            except Exception as e:
+                telemetry.record_error(e, 'main1.load' if job == 'load' else 'main1')
+                self.results.put(('error', job, e))
+
+    def load_neighbors(self):
+        # Memory-mapped similar-case index; predictions still work without it
+        try:
+            from neighbors import get_index
+
+            self.neighbors = get_index(self.predictor.mean, self.predictor.scale,
+                                       self.predictor.feature_columns)
+        except Exception as e:
+            telemetry.record_error(e, 'main1.neighbors')
+            self.neighbors = None
+
+    def run_bulk(self, path):
+        # Imported here so pandas is only loaded once bulk mode is used
+        from batch_predict import iter_scored_chunks
+        from dataset import count_rows
+
+        total = count_rows(path)
+        self.results.put(('bulk_start', total))
+        done = malignant = 0
+        chunks = iter_scored_chunks(path, lambda frame: self.predictor.predict(frame.to_numpy()),
+                                    BULK_CHUNK_SIZE, self.predictor.feature_columns)
+        for out in chunks:
+            # Checked between chunks, so a cancel takes effect within one
+            # chunk's scoring time
+            if self.cancel_bulk.is_set():
+                break
+            done += len(out)
+            malignant += int((out['prediction'] == 1).sum())
+            self.results.put(('bulk_chunk', out, done, total))
+        cancelled = self.cancel_bulk.is_set() and done < total
+        self.results.put(('bulk_done', done, total, cancelled, malignant))
+
+    def write_bulk_results(self, path, frames):
+        import pandas as pd
+
+        pd.concat(frames).to_csv(path, index=False)
+        self.results.put(('saved', path))
+
+    def poll_results(self):
+        # Apply everything the worker has finished since the last poll
+        try:
+            while True:
+                kind, *args = self.results.get_nowait()
+                getattr(self, f'on_{kind}')(*args)
+        except queue.Empty:
+            pass
+        self.root.after(POLL_MS, self.poll_results)
+
+    def on_loaded(self):
+        # Hide the fields a model trained on a pruned feature set ignores
+        required = set(self.predictor.feature_columns)
+        for column, key in self.entry_columns.items():
+            if column not in required:
+                self.entries[key].grid_remove()
+                self.entry_labels[key].grid_remove()
+        self.result_text.set("")
+        self.predict_btn.configure(state='normal')
+        self.bulk_btn.configure(state='normal')
+
+    def on_prediction(self, prediction, probabilities, cases):
+        # Display results
+        with telemetry.stage('render'):
             self.result_text.set(f"Prediction: {'MALIGNANT' if prediction[0] == 1 else 'BENIGN'}")
             self.benign_prob.set(f"Benign Probability: {probabilities[0][0]:.2%}")
             self.malignant_prob.set(f"Malignant Probability: {probabilities[0][1]:.2%}")
+            if cases:
+                lines = [f"Case {case['id']}: {'MALIGNANT' if case['diagnosis'] == 'M' else 'BENIGN'} "
+                         f"(distance {case['distance']:.2f})" for case in cases]
+                self.similar_cases.set("Most similar cases:\n" + "\n".join(lines))
+        self.predict_btn.configure(state='normal')
 
-        except ValueError as e:
-            messagebox.showerror("Error", "Please enter valid numeric values for all fields.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    def on_bulk_start(self, total):
+        if self.bulk_window.exists():
+            self.bulk_window.start(total)
+
+    def on_bulk_chunk(self, out, done, total):
+        self.bulk_frames.append(out)
+        if self.bulk_window.exists():
+            self.bulk_window.add_chunk(out, done, total)
+
+    def on_bulk_done(self, done, total, cancelled, malignant):
+        self.bulk_btn.configure(state='normal')
+        if self.bulk_window.exists():
+            self.bulk_window.finish(done, total, cancelled, malignant)
+
+    def on_saved(self, path):
+        messagebox.showinfo("Results Saved", f"Predictions written to {path}")
+
+    def on_error(self, job, error):
+        if job == 'load':
+            self.result_text.set("")
+            messagebox.showerror("Error", "Model files not found!")
+            return
+        if job == 'predict':
+            self.result_text.set("")
+            self.predict_btn.configure(state='normal')
+        elif job == 'bulk':
+            self.bulk_btn.configure(state='normal')
+            if self.bulk_window.exists():
+                self.bulk_window.fail(str(error))
+        messagebox.showerror("Error", f"An error occurred: {str(error)}")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+from inference import FEATURE_COLUMNS
+
+DEFAULT_MAX_SIZE = 4096
+DEFAULT_PRECISION = 6
+
+
+class PredictionCache:
+    # LRU cache of single-row predictions keyed on the canonical feature
+    # vector: values rounded to `precision` decimals, in model column order.
+    # Entries are tied to a model version; a different version empties the
+    # cache so a reloaded model never serves stale results.
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=None, precision=DEFAULT_PRECISION,
+                 columns=FEATURE_COLUMNS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.precision = precision
+        self.columns = list(columns)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def canonicalize(self, features, columns=None):
+        # Mappings are keyed by feature name; sequences must already be in
+        # model column order. `columns` overrides the default column list
+        # for models trained on a subset of the features.
+        columns = self.columns if columns is None else columns
+        if hasattr(features, 'keys'):
+            values = [features[col] for col in columns]
+        else:
+            values = list(features)
+            if len(values) != len(columns):
+                raise ValueError(f"Expected {len(columns)} features, got {len(values)}")
+        # + 0.0 folds -0.0 into 0.0 so both hash the same
+        return tuple(round(float(v), self.precision) + 0.0 for v in values)
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, features, version, compute, columns=None):
+        # compute() receives the canonical values so a cached result never
+        # depends on which of the equivalent inputs populated it. Columns
+        # are fixed per model version, so keys never mix feature sets.
+        key = self.canonicalize(features, columns)
+        value = self.get(key, version)
+        if value is None:
+            value = compute(key)
+            self.put(key, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_prediction_cache(**kwargs):
+    # Process-wide cache shared by every Streamlit session and rerun
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PredictionCache(**kwargs)
+        return _default_cache
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import namedtuple
+
+from inference import MODEL_PATH, SCALER_PATH, model_columns
+
+# One immutable snapshot of the artifacts; swapping the whole tuple keeps
+# model and scaler consistent with each other for every reader
+LoadedModel = namedtuple('LoadedModel', ['model', 'scaler', 'version', 'load_seconds', 'loaded_at',
+                                         'feature_columns'])
+
+
+# train.deploy() replaces the model and the scaler one after the other.
+# Before either rename it publishes the SHA-256 of both new files here, and
+# the registry only accepts a pair whose bytes match, so a check between the
+# two renames never pairs the new model with the old scaler. The stamp is
+# removed once both files are in place; it only marks a deploy in progress.
+PAIR_STAMP_SUFFIX = '.pair.json'
+# How long a process with no model yet waits for a deploy to finish, and
+# how old a stamp may be before it is taken for a deploy that died midway
+PAIR_WAIT_SECONDS = 5.0
+
+
+def pair_stamp_path(model_path=MODEL_PATH):
+    return os.path.splitext(model_path)[0] + PAIR_STAMP_SUFFIX
+
+
+def write_pair_stamp(model_bytes, scaler_bytes, model_path=MODEL_PATH):
+    path = pair_stamp_path(model_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'model_sha256': hashlib.sha256(model_bytes).hexdigest(),
+                   'scaler_sha256': hashlib.sha256(scaler_bytes).hexdigest()}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def remove_pair_stamp(model_path=MODEL_PATH):
+    try:
+        os.remove(pair_stamp_path(model_path))
+    except FileNotFoundError:
+        pass
+
+
+def _pair_matches(model_bytes, scaler_bytes, model_path, scaler_path):
+    # Without a stamp no deploy is running and any pair is accepted. A stamp
+    # older than both files (they were written afterwards, e.g. by the
+    # notebook or a manual restore) or older than PAIR_WAIT_SECONDS is left
+    # over from a deploy that never finished and is ignored too.
+    path = pair_stamp_path(model_path)
+    try:
+        stamped = os.stat(path).st_mtime
+        with open(path) as f:
+            stamp = json.load(f)
+    except FileNotFoundError:
+        return True
+    if (stamped < min(os.stat(model_path).st_mtime, os.stat(scaler_path).st_mtime)
+            or time.time() - stamped > PAIR_WAIT_SECONDS):
+        return True
+    return (stamp['model_sha256'] == hashlib.sha256(model_bytes).hexdigest()
+            and stamp['scaler_sha256'] == hashlib.sha256(scaler_bytes).hexdigest())
+
+
+class MismatchedPair(Exception):
+    pass
+
+
+class ModelRegistry:
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, check_interval=2.0):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._stamp = None
+        self._last_check = 0.0
+
+    def _file_stamp(self):
+        return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size)
+                     for p in (self.model_path, self.scaler_path))
+
+    def _load(self):
+        start = time.perf_counter()
+        with open(self.model_path, 'rb') as f:
+            model_bytes = f.read()
+        with open(self.scaler_path, 'rb') as f:
+            scaler_bytes = f.read()
+        if not _pair_matches(model_bytes, scaler_bytes, self.model_path, self.scaler_path):
+            raise MismatchedPair(f"{self.model_path} and {self.scaler_path} are from different deploys")
+        model = pickle.loads(model_bytes)
+        scaler = pickle.loads(scaler_bytes)
+        version = hashlib.sha256(model_bytes + scaler_bytes).hexdigest()[:12]
+        return LoadedModel(model, scaler, version, time.perf_counter() - start, time.time(),
+                           model_columns(scaler))
+
+    def get(self):
+        # Cheap path: reuse the snapshot and only stat the files every
+        # check_interval seconds
+        now = time.monotonic()
+        current = self._current
+        if current is not None and now - self._last_check < self.check_interval:
+            return current
+
+        with self._lock:
+            if self._current is not None and now - self._last_check < self.check_interval:
+                return self._current
+            self._last_check = now
+            stamp = self._file_stamp()
+            if self._current is not None and stamp == self._stamp:
+                return self._current
+            deadline = time.monotonic() + PAIR_WAIT_SECONDS
+            while True:
+                try:
+                    loaded = self._load()
+                    break
+                except MismatchedPair:
+                    # Mid-deploy: keep serving the previous pair and retry
+                    # on the next check; with nothing loaded yet, wait for
+                    # the deploy to finish
+                    if self._current is not None:
+                        return self._current
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+                    stamp = self._file_stamp()
+                except Exception:
+                    # A half-written pickle during a deploy: keep serving the
+                    # previous model and retry on the next check
+                    if self._current is None:
+                        raise
+                    return self._current
+            self._current = loaded
+            self._stamp = stamp
+            return loaded
+
+    def reload(self):
+        with self._lock:
+            self._last_check = 0.0
+            self._stamp = None
+        return self.get()
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    # One registry per artifact pair for the whole process, shared across
+    # Streamlit sessions and reruns
+    key = (os.path.abspath(model_path), os.path.abspath(scaler_path))
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = ModelRegistry(model_path, scaler_path)
+        return _registries[key]
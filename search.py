@@ -0,0 +1,264 @@
+import argparse
+import math
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.base import clone
+from sklearn.model_selection import (GridSearchCV, HalvingRandomSearchCV, ParameterGrid,
+                                     StratifiedKFold, cross_val_score)
+from sklearn.svm import SVC
+
+from train import CORRELATION_THRESHOLD, RANDOM_STATE, build_model, load_dataset, split_and_scale
+
+# The grids searched in project.ipynb, with the cv used there. 'deviance'
+# is the old name of GradientBoostingClassifier's 'log_loss'.
+SEARCH_SPACES = {
+    'dt': ({
+        'criterion': ['gini', 'entropy'],
+        'max_depth': list(range(2, 32)),
+        'min_samples_leaf': list(range(1, 10)),
+        'min_samples_split': list(range(2, 10)),
+        'splitter': ['best', 'random'],
+    }, 5),
+    'svc': ({
+        'gamma': [0.0001, 0.001, 0.01, 0.1],
+        'C': [0.1, 0.05, 0.5, 0.1, 1, 10, 15, 20],
+    }, 5),
+    'gbdt': ({
+        'loss': ['log_loss', 'exponential'],
+        'learning_rate': [0.001, 0.1],
+        'n_estimators': [100, 150, 180],
+    }, 2),
+}
+
+STRATEGIES = ('grid', 'halving', 'hyperband', 'precomputed')
+HALVING_FACTOR = 3
+# Halving samples this many candidates: with a few hundred training rows
+# there is not enough data to halve 8,640 candidates
+MAX_HALVING_CANDIDATES = HALVING_FACTOR ** 5
+# Share of the training rows the sampled candidates start on; much smaller
+# samples make the first eliminations little better than random for trees
+MIN_RESOURCE_FRACTION = 0.2
+# Rows per block when building distance and kernel matrices
+KERNEL_BLOCK_ROWS = 1024
+
+
+def _fits(search, cv):
+    # One fit per (candidate, fold) at every iteration, plus the final refit
+    return len(search.cv_results_['params']) * cv + 1
+
+
+def grid_search(estimator, space, cv, X, y, n_jobs=None):
+    search = GridSearchCV(estimator, space, cv=cv, n_jobs=n_jobs)
+    search.fit(X, y)
+    return search.best_params_, search.best_score_, _fits(search, cv)
+
+
+def halving_evaluations(n_candidates, factor=HALVING_FACTOR):
+    # Candidate evaluations (x cv fits) of a full successive-halving
+    # schedule: every candidate in the first round, then the best
+    # ceil(1/factor) of them each round, for 1 + floor(log_factor(n)) rounds
+    total, remaining, scale = 0, n_candidates, 1
+    while scale <= n_candidates:
+        total += remaining
+        remaining = -(-remaining // factor)
+        scale *= factor
+    return total
+
+
+def halving_pays_off(space, factor=HALVING_FACTOR):
+    # Halving's first round alone scores every candidate it starts with, so
+    # on a grid it could search in full it never needs fewer fits than the
+    # grid, and its early rounds on a few dozen rows pick worse (0.960 vs
+    # 0.980 CV on the SVC grid). It only pays when it samples from a grid
+    # larger than its whole schedule.
+    n_grid = len(ParameterGrid(space))
+    return halving_evaluations(min(n_grid, MAX_HALVING_CANDIDATES), factor) < n_grid
+
+
+def halving_search(estimator, space, cv, X, y, n_jobs=None):
+    # Successive halving over a random sample of a large grid: every
+    # sampled candidate starts on a share of the training rows and only the
+    # best 1/factor move on to more rows. Grids where that would not save
+    # fits get the plain grid search.
+    if not halving_pays_off(space):
+        return grid_search(estimator, space, cv, X, y, n_jobs)
+    # Aggressive elimination keeps halving on the smallest sample until
+    # the survivors fit the remaining row budget
+    search = HalvingRandomSearchCV(estimator, space, n_candidates=MAX_HALVING_CANDIDATES,
+                                   min_resources=int(MIN_RESOURCE_FRACTION * len(X)),
+                                   aggressive_elimination=True, cv=cv, factor=HALVING_FACTOR,
+                                   random_state=RANDOM_STATE, n_jobs=n_jobs)
+    search.fit(X, y)
+    return search.best_params_, search.best_score_, _fits(search, cv)
+
+
+def hyperband_search(estimator, space, cv, X, y, n_jobs=None, min_resources=None):
+    # Hyperband: several successive-halving brackets trading the number of
+    # random candidates against how many rows each starts with
+    max_resources = len(X)
+    if min_resources is None:
+        min_resources = 2 * cv * len(np.unique(y))
+    s_max = int(math.log(max_resources / min_resources, HALVING_FACTOR))
+    n_grid = len(ParameterGrid(space))
+
+    best_params, best_score, fits = None, -np.inf, 0
+    for s in range(s_max, -1, -1):
+        n_candidates = min(n_grid, int(math.ceil((s_max + 1) / (s + 1) * HALVING_FACTOR ** s)))
+        search = HalvingRandomSearchCV(
+            estimator, space, n_candidates=n_candidates, cv=cv, factor=HALVING_FACTOR,
+            min_resources=int(max_resources / HALVING_FACTOR ** s), max_resources=max_resources,
+            random_state=RANDOM_STATE + s, n_jobs=n_jobs)
+        search.fit(X, y)
+        fits += _fits(search, cv)
+        if search.best_score_ > best_score:
+            best_params, best_score = search.best_params_, search.best_score_
+    return best_params, best_score, fits
+
+
+def squared_distances(X, block_rows=KERNEL_BLOCK_ROWS, out=None):
+    # Pairwise squared Euclidean distances, one block of rows at a time so
+    # the only n x n allocation is the result itself (pass a np.memmap as
+    # `out` to keep even that on disk)
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    n = len(X)
+    if out is None:
+        out = np.empty((n, n))
+    sq_norms = np.einsum('ij,ij->i', X, X)
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        block = out[start:stop]
+        np.dot(X[start:stop], X.T, out=block)
+        block *= -2.0
+        block += sq_norms[start:stop, None]
+        block += sq_norms[None, :]
+        np.maximum(block, 0.0, out=block)
+        block[np.arange(stop - start), np.arange(start, stop)] = 0.0
+    return out
+
+
+def rbf_from_distances(distances, rows, cols, gamma, block_rows=KERNEL_BLOCK_ROWS):
+    # exp(-gamma * d^2) for distances[rows][:, cols], gathered block_rows
+    # rows at a time straight into the result and exponentiated in place,
+    # so besides the result only one block_rows x n slice is held
+    kernel = np.empty((len(rows), len(cols)))
+    for start in range(0, len(rows), block_rows):
+        block = kernel[start:start + block_rows]
+        np.take(distances[rows[start:start + block_rows]], cols, axis=1, out=block)
+        np.multiply(block, -gamma, out=block)
+        np.exp(block, out=block)
+    return kernel
+
+
+def _fold_score(estimator, C, train_kernel, test_kernel, y_train, y_test):
+    model = clone(estimator).set_params(C=C)
+    model.fit(train_kernel, y_train)
+    return np.mean(model.predict(test_kernel) == y_test)
+
+
+def precomputed_svc_search(estimator, space, cv, X, y, n_jobs=None, block_rows=KERNEL_BLOCK_ROWS,
+                           distances_path=None):
+    # RBF-SVC grid search that computes the distance matrix once. Only gamma
+    # changes the kernel, so for each gamma and fold the fold's train and
+    # test kernels are derived from it with one vectorized exp and shared by
+    # every C value, fitted on threads (all cores unless n_jobs says
+    # otherwise; they share the kernels, so threads cost no extra memory).
+    # Folds, candidate order and tie-breaking follow GridSearchCV, so the
+    # pick is the same.
+    #
+    # Memory stays O(n^2): the n x n distance matrix (8n^2 bytes, on disk
+    # when distances_path names a file to memory-map) plus one fold's
+    # kernels, (cv-1)/cv * n x n for training and (1/cv) * (cv-1)/cv * n x n
+    # for testing, i.e. 0.8 * 8n^2 bytes at cv=5, plus one block_rows x n
+    # slice while a kernel is gathered. Each fold's kernels are released
+    # before the next ones are built.
+    y = np.asarray(y)
+    base = SVC(kernel='precomputed', **{k: v for k, v in estimator.get_params().items()
+                                        if k in ('class_weight', 'tol', 'shrinking', 'max_iter')})
+    folds = list(StratifiedKFold(n_splits=cv).split(X, y))
+    candidates = list(ParameterGrid(space))
+
+    out = None
+    if distances_path is not None:
+        out = np.lib.format.open_memmap(distances_path, mode='w+', dtype=np.float64, shape=(len(X), len(X)))
+    distances = squared_distances(X, block_rows, out=out)
+    fold_scores = {}
+    parallel = Parallel(n_jobs=-1 if n_jobs is None else n_jobs, prefer='threads')
+    for gamma in sorted({c['gamma'] for c in candidates}):
+        c_values = sorted({c['C'] for c in candidates if c['gamma'] == gamma})
+        for train, test in folds:
+            train_kernel = rbf_from_distances(distances, train, train, gamma, block_rows)
+            test_kernel = rbf_from_distances(distances, test, train, gamma, block_rows)
+            results = parallel(delayed(_fold_score)(base, C, train_kernel, test_kernel, y[train], y[test])
+                               for C in c_values)
+            for C, score in zip(c_values, results):
+                fold_scores.setdefault((C, gamma), []).append(score)
+            del train_kernel, test_kernel
+    scores = {key: np.average(values) for key, values in fold_scores.items()}
+
+    # First candidate with the highest mean score, as GridSearchCV's rank
+    means = np.array([scores[(c['C'], c['gamma'])] for c in candidates])
+    best = int(np.flatnonzero(means == means.max())[0])
+    fits = len(scores) * cv + 1
+    return candidates[best], means[best], fits
+
+
+SEARCHES = {
+    'grid': grid_search,
+    'halving': halving_search,
+    'hyperband': hyperband_search,
+    'precomputed': precomputed_svc_search,
+}
+
+
+def tune(family, strategy, X, y, n_jobs=None, distances_path=None):
+    space, cv = SEARCH_SPACES[family]
+    estimator = build_model(family)
+    if strategy == 'precomputed' and family != 'svc':
+        strategy = 'grid'
+    if strategy == 'halving' and not halving_pays_off(space):
+        strategy = 'grid'
+    start = time.perf_counter()
+    extra = {'distances_path': distances_path} if strategy == 'precomputed' else {}
+    best_params, best_score, fits = SEARCHES[strategy](estimator, space, cv, X, y, n_jobs=n_jobs, **extra)
+
+    # Halving scores the winner on its last (possibly partial) sample;
+    # re-score every strategy's pick on the full training rows so the best
+    # scores are comparable
+    if strategy not in ('grid', 'precomputed'):
+        model = clone(estimator).set_params(**best_params)
+        best_score = cross_val_score(model, X, y, cv=cv, n_jobs=n_jobs).mean()
+        fits += cv
+    return {
+        'family': family,
+        'strategy': strategy,
+        'best_params': best_params,
+        'best_score': float(best_score),
+        'fits': fits,
+        'wall_seconds': time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare hyperparameter search strategies')
+    parser.add_argument('--family', choices=list(SEARCH_SPACES), default='dt')
+    parser.add_argument('--strategies', default='halving,hyperband',
+                        help='comma-separated subset of: ' + ', '.join(STRATEGIES))
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--distances-memmap', metavar='PATH',
+                        help="keep the precomputed strategy's n x n distance matrix in this .npy file")
+    args = parser.parse_args()
+
+    X, y = load_dataset()
+    X_train, _, y_train, _, _ = split_and_scale(X, y, correlation_threshold=CORRELATION_THRESHOLD)
+
+    print(f"{'strategy':<10} {'fits':>7} {'wall s':>8} {'best cv':>8}  params")
+    for strategy in args.strategies.split(','):
+        r = tune(args.family, strategy.strip(), X_train, y_train, args.jobs, args.distances_memmap)
+        print(f"{r['strategy']:<10} {r['fits']:>7} {r['wall_seconds']:>8.2f} {r['best_score']:>8.4f}  {r['best_params']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from inference import load_model, model_columns, predict_batch, predict_with_proba
+from telemetry import telemetry
+
+# What-if sweeps: every feature is moved on its own across a range around
+# the entered values while the others stay fixed. The whole grid (features
+# x steps rows) is scored in one vectorized scaler+SVC call.
+
+DEFAULT_STEPS = 25
+# Half-width of each sweep in training standard deviations (scaler.scale_)
+DEFAULT_SPAN = 2.0
+
+
+def sweep_grid(values, scale, steps=DEFAULT_STEPS, span=DEFAULT_SPAN):
+    # values: the entered row, scale: per-feature step unit, both in model
+    # column order. Returns (offsets in units of scale, grid) where rows
+    # j*steps .. (j+1)*steps-1 of grid vary feature j only. Measurements are
+    # non-negative, so swept values are clipped at zero.
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.linspace(-span, span, steps)
+    n = len(values)
+    grid = np.repeat(values[None, :], n * steps, axis=0)
+    rows = np.arange(n * steps)
+    features = rows // steps
+    grid[rows, features] = np.maximum(values[features] + np.tile(offsets, n) * np.asarray(scale)[features], 0.0)
+    return offsets, grid
+
+
+def sweep(model, scaler, values, columns, steps=DEFAULT_STEPS, span=DEFAULT_SPAN):
+    # Malignant probability for every (feature, step) as a frame indexed by
+    # the offset, one column per feature, plus the swept feature values.
+    # Not scored through predict_batch: the synthetic rows must not count
+    # towards the prediction totals, batch sizes and per-prediction stage
+    # latencies telemetry exports, so the sweep is recorded under stages of
+    # its own ('sensitivity_sweep', 'sweep_decision', 'sweep_calibrate').
+    with telemetry.stage('sensitivity_sweep'):
+        offsets, grid = sweep_grid(values, scaler.scale_, steps, span)
+        _, probabilities = predict_with_proba(model, scaler.transform(pd.DataFrame(grid, columns=columns)),
+                                              stage_prefix='sweep_')
+    curves = pd.DataFrame(probabilities[:, 1].reshape(len(columns), steps).T, index=offsets, columns=columns)
+    swept = pd.DataFrame(grid[np.arange(len(grid)), np.arange(len(grid)) // steps].reshape(len(columns), steps).T,
+                         index=offsets, columns=columns)
+    curves.index.name = swept.index.name = 'offset (std)'
+    return curves, swept
+
+
+def influence(curves):
+    # Largest swing in malignant probability per feature, most sensitive first
+    return (curves.max() - curves.min()).sort_values(ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time a sensitivity sweep against one-row predictions')
+    parser.add_argument('--data', default='data1.csv')
+    parser.add_argument('--row', type=int, default=0, help='data row the sweep is centred on')
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS)
+    parser.add_argument('--span', type=float, default=DEFAULT_SPAN)
+    args = parser.parse_args()
+
+    model, scaler = load_model()
+    columns = model_columns(scaler)
+    values = np.asarray(dataset.select(dataset.load(args.data), columns)[args.row])
+
+    sweep(model, scaler, values, columns, args.steps, args.span)
+    start = time.perf_counter()
+    curves, _ = sweep(model, scaler, values, columns, args.steps, args.span)
+    swept = time.perf_counter() - start
+
+    _, grid = sweep_grid(values, scaler.scale_, args.steps, args.span)
+    frames = [pd.DataFrame(row[None, :], columns=columns) for row in grid]
+    start = time.perf_counter()
+    for frame in frames:
+        predict_batch(model, scaler, frame)
+    single = (time.perf_counter() - start) / len(frames)
+
+    print(f"{len(grid)} rows ({len(columns)} features x {args.steps} steps): sweep {swept * 1000:.1f} ms, "
+          f"one row {single * 1000:.2f} ms (= {swept / single:.1f} single predictions), "
+          f"{len(grid)} single calls {single * len(grid) * 1000:.0f} ms")
+    print("most influential:")
+    for name, swing in influence(curves).head(5).items():
+        print(f"  {name:<24} {swing:.3f}")
+
+
+if __name__ == '__main__':
+    main()
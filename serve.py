@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from inference import FEATURE_COLUMNS, predict_batch
+from registry import get_registry
+from telemetry import telemetry
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+class MicroBatcher:
+    # Collects rows from concurrent requests and scores them together, so a
+    # single scaler.transform and SVC kernel call serves many clients.
+    # A batch is flushed when it reaches max_batch_size rows or when the
+    # oldest queued request has waited max_wait seconds. With a cascade
+    # (cascade.Cascade) batches are scored by it instead of the registry's SVC.
+    def __init__(self, registry, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT_MS / 1000,
+                 cascade=None):
+        self.registry = registry
+        self.cascade = cascade
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.rows = 0
+        self._worker = None
+
+    def start(self):
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _collect(self):
+        pending = [await self.queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def feature_columns(self):
+        if self.cascade is not None:
+            return self.cascade.feature_columns
+        return self.registry.get().feature_columns
+
+    def _score(self, matrix):
+        if self.cascade is not None:
+            return self.cascade.predict(matrix)
+        loaded = self.registry.get()
+        features = pd.DataFrame(matrix, columns=loaded.feature_columns)
+        return predict_batch(loaded.model, loaded.scaler, features)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = await self._collect()
+            try:
+                # Requests parsed on either side of a hot reload can differ
+                # in width, so stacking them fails like scoring does
+                matrix = np.vstack([rows for rows, _ in pending])
+                # Score off the event loop so new requests keep queueing
+                # while the current batch runs
+                prediction, probabilities = await loop.run_in_executor(None, self._score, matrix)
+            except Exception as e:
+                if len(pending) == 1:
+                    if not pending[0][1].done():
+                        pending[0][1].set_exception(e)
+                else:
+                    # Rescore request by request, so one bad submission only
+                    # fails its own caller
+                    await self._score_each(pending)
+                continue
+
+            self.batches += 1
+            self.rows += len(matrix)
+            offset = 0
+            for rows, future in pending:
+                n = len(rows)
+                if not future.done():
+                    future.set_result((prediction[offset:offset + n], probabilities[offset:offset + n]))
+                offset += n
+
+    async def _score_each(self, pending):
+        loop = asyncio.get_running_loop()
+        for rows, future in pending:
+            try:
+                result = await loop.run_in_executor(None, self._score, rows)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(rows)
+            if not future.done():
+                future.set_result(result)
+
+
+def parse_rows(payload, columns=FEATURE_COLUMNS):
+    # Accepts one object or a list of objects keyed by the feature names;
+    # only the model's columns are read, other keys are ignored
+    records = payload if isinstance(payload, list) else [payload]
+    if not records:
+        raise ValueError("No rows given")
+    try:
+        rows = np.array([[float(record[col]) for col in columns] for record in records])
+    except KeyError as e:
+        raise ValueError(f"Missing feature: {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("Feature values must be numeric")
+    # json.loads accepts NaN and Infinity
+    if not np.isfinite(rows).all():
+        raise ValueError("Feature values must be finite")
+    return rows
+
+
+def format_results(prediction, probabilities):
+    return [
+        {
+            'prediction': int(label),
+            'benign_probability': float(proba[0]),
+            'malignant_probability': float(proba[1]),
+        }
+        for label, proba in zip(prediction, probabilities)
+    ]
+
+
+async def read_request(reader):
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def write_response(writer, status, payload, keep_alive):
+    # str payloads go out as plain text (the /metrics snapshot), the rest as JSON
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), 'text/plain; version=0.0.4'
+    else:
+        body, content_type = json.dumps(payload).encode(), 'application/json'
+    reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+    head = (f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode() + body)
+
+
+class ScoringServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            loaded = self.batcher.registry.get()
+            health = {'status': 'ok', 'model_version': loaded.version, 'features': self.batcher.feature_columns()}
+            if self.batcher.cascade is not None:
+                health['cascade'] = self.batcher.cascade.stats()
+            return 200, health
+        if method == 'GET' and path == '/metrics':
+            return 200, telemetry.prometheus_text()
+        if method == 'POST' and path == '/predict':
+            try:
+                rows = parse_rows(json.loads(body), self.batcher.feature_columns())
+            except ValueError as e:
+                telemetry.record_error(e, 'serve.request')
+                return 400, {'error': str(e)}
+            try:
+                prediction, probabilities = await self.batcher.submit(rows)
+            except Exception as e:
+                telemetry.record_error(e, 'serve.predict')
+                return 500, {'error': str(e)}
+            return 200, {'results': format_results(prediction, probabilities)}
+        return 404, {'error': f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.handle(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host, port, max_batch_size, max_wait, cascade=None):
+    registry = get_registry()
+    registry.get()
+    batcher = MicroBatcher(registry, max_batch_size, max_wait, cascade)
+    batcher.start()
+    server = await asyncio.start_server(ScoringServer(batcher).handle_connection, host, port)
+    print(f"Serving on http://{host}:{port} (max batch {max_batch_size}, max wait {max_wait * 1000:.1f} ms)")
+    async with server:
+        await server.serve_forever()
+
+
+async def _client(host, port, body, requests):
+    reader, writer = await asyncio.open_connection(host, port)
+    request = (f"POST /predict HTTP/1.1\r\nHost: {host}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+    for _ in range(requests):
+        writer.write(request)
+        await writer.drain()
+        headers = {}
+        await reader.readline()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        await reader.readexactly(int(headers['content-length']))
+    writer.close()
+
+
+async def bench(host, port, clients, requests):
+    # Load generator: each client sends `requests` single-row predictions
+    # back to back over one keep-alive connection
+    sample = pd.read_csv('data1.csv', nrows=1)
+    body = json.dumps({col: float(sample[col].iloc[0]) for col in FEATURE_COLUMNS}).encode()
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, port, body, requests) for _ in range(clients)])
+    elapsed = time.perf_counter() - start
+    total = clients * requests
+    print(f"{total} requests from {clients} clients in {elapsed:.2f}s ({total / elapsed:,.0f} req/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP scoring service with micro-batching')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                        help='rows per scoring call; 1 disables batching')
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT_MS)
+    parser.add_argument('--cascade', metavar='VERSION_DIR',
+                        help="score with that train.py version's LR first and escalate uncertain rows to its SVC")
+    parser.add_argument('--band', default='0.1,0.9',
+                        help='malignant probability range the cascade escalates')
+    parser.add_argument('--bench', action='store_true', help='run the load generator against a running server')
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=20, help='requests per client in --bench mode')
+    args = parser.parse_args()
+
+    if args.bench:
+        asyncio.run(bench(args.host, args.port, args.clients, args.requests))
+    else:
+        cascade = None
+        if args.cascade:
+            from cascade import Cascade
+
+            cascade = Cascade.from_version(args.cascade, band=tuple(float(v) for v in args.band.split(',')))
+        asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms / 1000, cascade))
+
+
+if __name__ == '__main__':
+    main()
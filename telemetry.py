@@ -0,0 +1,194 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Low-overhead instrumentation for the prediction path: fixed-bucket
+# histograms and counters kept in process, exported as a Prometheus text
+# snapshot, plus one structured log line per prediction call when the
+# 'tumotrack.predictions' logger is enabled at INFO.
+
+logger = logging.getLogger('tumotrack.predictions')
+
+# Seconds, log-spaced from 10us to 10s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Stage:
+    __slots__ = ('telemetry', 'name', 'start')
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Telemetry:
+    # The hot path only appends raw observations to deques (atomic, no lock);
+    # they are folded into the histograms when a snapshot is taken or once
+    # FLUSH_EVERY of them have queued up.
+    FLUSH_EVERY = 1024
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending_stages = deque()
+        self._pending_batches = deque()
+        self.stages = {}
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.errors = {}
+        self.predictions = {'benign': 0, 'malignant': 0}
+
+    def stage(self, name):
+        # with telemetry.stage('scale'): ...
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def observe_stage(self, name, seconds):
+        self._pending_stages.append((name, seconds))
+        # Collected per thread for the structured log line of this call
+        if logger.isEnabledFor(logging.INFO):
+            timings = self._local.__dict__.setdefault('timings', {})
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    def record_predictions(self, prediction, stages=None):
+        # Call once per prediction call. Hot paths can pass their stage
+        # timings here ({name: seconds}) instead of using stage().
+        if not self.enabled:
+            return
+        # Labels are 0 (benign) / 1 (malignant)
+        size = len(prediction)
+        malignant = int(np.count_nonzero(prediction))
+        self._pending_batches.append((size, malignant))
+        if stages:
+            self._pending_stages.extend(stages.items())
+        if len(self._pending_stages) >= self.FLUSH_EVERY:
+            self.flush()
+        if logger.isEnabledFor(logging.INFO):
+            timings = self._local.__dict__.pop('timings', {})
+            if stages:
+                for name, seconds in stages.items():
+                    timings[name] = timings.get(name, 0.0) + seconds
+            logger.info(json.dumps({
+                'event': 'prediction',
+                'batch_size': size,
+                'malignant': malignant,
+                'stages_ms': {k: round(v * 1000, 3) for k, v in timings.items()},
+            }))
+
+    def flush(self):
+        # popleft until empty rather than swapping the deques, so nothing
+        # appended concurrently is lost
+        with self._lock:
+            pending = self._pending_stages
+            while pending:
+                name, seconds = pending.popleft()
+                histogram = self.stages.get(name)
+                if histogram is None:
+                    histogram = self.stages[name] = Histogram(LATENCY_BUCKETS)
+                histogram.observe(seconds)
+            pending = self._pending_batches
+            while pending:
+                size, malignant = pending.popleft()
+                self.batch_sizes.observe(size)
+                self.predictions['malignant'] += malignant
+                self.predictions['benign'] += size - malignant
+
+    def record_error(self, error, source):
+        kind = type(error).__name__
+        self._local.__dict__.pop('timings', None)
+        with self._lock:
+            key = (source, kind)
+            self.errors[key] = self.errors.get(key, 0) + 1
+        logger.error(json.dumps({'event': 'prediction_error', 'source': source,
+                                 'error_type': kind, 'message': str(error)}))
+
+    def reset(self):
+        with self._lock:
+            self._pending_stages.clear()
+            self._pending_batches.clear()
+            self.stages = {}
+            self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+            self.errors = {}
+            self.predictions = {'benign': 0, 'malignant': 0}
+
+    def prometheus_text(self):
+        self.flush()
+        lines = []
+        with self._lock:
+            lines.append('# HELP tumotrack_stage_seconds Time spent in each prediction stage')
+            lines.append('# TYPE tumotrack_stage_seconds histogram')
+            for name, histogram in sorted(self.stages.items()):
+                lines.extend(_histogram_lines('tumotrack_stage_seconds', histogram, f'stage="{name}"'))
+
+            lines.append('# HELP tumotrack_batch_size Rows per prediction call')
+            lines.append('# TYPE tumotrack_batch_size histogram')
+            lines.extend(_histogram_lines('tumotrack_batch_size', self.batch_sizes, ''))
+
+            lines.append('# HELP tumotrack_predictions_total Predictions by class')
+            lines.append('# TYPE tumotrack_predictions_total counter')
+            for label, count in sorted(self.predictions.items()):
+                lines.append(f'tumotrack_predictions_total{{class="{label}"}} {count}')
+
+            lines.append('# HELP tumotrack_errors_total Prediction errors by source and type')
+            lines.append('# TYPE tumotrack_errors_total counter')
+            for (source, kind), count in sorted(self.errors.items()):
+                lines.append(f'tumotrack_errors_total{{source="{source}",type="{kind}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _histogram_lines(metric, histogram, labels):
+    sep = ',' if labels else ''
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {histogram.count}')
+    braces = f'{{{labels}}}' if labels else ''
+    lines.append(f'{metric}_sum{braces} {histogram.sum:.9g}')
+    lines.append(f'{metric}_count{braces} {histogram.count}')
+    return lines
+
+
+# Shared by every entry point in the process
+telemetry = Telemetry()
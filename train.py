@@ -0,0 +1,341 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn import metrics
+from sklearn.impute import SimpleImputer
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+import dataset
+from compact_model import ARTIFACT_PATH, pickle_version
+from inference import FEATURE_COLUMNS, LABEL_COLUMN, MODEL_PATH, SCALER_PATH
+
+DATA_PATH = 'data1.csv'
+ARTIFACTS_DIR = 'artifacts'
+RANDOM_STATE = 42
+TEST_SIZE = 0.2
+# project.ipynb drops one column of every pair correlated above this,
+# leaving 23 of the 30 features on the training split
+CORRELATION_THRESHOLD = 0.92
+
+# The seven families from project.ipynb with the hyperparameters chosen
+# there. Stored as (module, class, params) so worker processes can build
+# them without pickling estimator instances.
+MODEL_FAMILIES = {
+    'lr': ('sklearn.linear_model', 'LogisticRegression', {}),
+    'knn': ('sklearn.neighbors', 'KNeighborsClassifier', {}),
+    'svc': ('sklearn.svm', 'SVC', {'C': 15, 'gamma': 0.01, 'probability': True,
+                                   'random_state': RANDOM_STATE}),
+    'dt': ('sklearn.tree', 'DecisionTreeClassifier', {
+        'criterion': 'entropy', 'max_depth': 15, 'min_samples_leaf': 4,
+        'min_samples_split': 5, 'splitter': 'random', 'random_state': RANDOM_STATE}),
+    'rf': ('sklearn.ensemble', 'RandomForestClassifier', {
+        'criterion': 'entropy', 'max_depth': 10, 'max_features': 0.5, 'min_samples_leaf': 2,
+        'min_samples_split': 3, 'n_estimators': 130, 'random_state': RANDOM_STATE}),
+    'gbdt': ('sklearn.ensemble', 'GradientBoostingClassifier', {
+        'learning_rate': 0.1, 'loss': 'exponential', 'n_estimators': 180,
+        'random_state': RANDOM_STATE}),
+    'xgb': ('xgboost', 'XGBClassifier', {
+        'objective': 'binary:logistic', 'learning_rate': 0.01, 'max_depth': 5,
+        'n_estimators': 180, 'random_state': RANDOM_STATE}),
+}
+
+
+def load_dataset(path=DATA_PATH):
+    # Features in model order and diagnosis as M=1, B=0, read from the
+    # columnar cache of data1.csv (see dataset.py) rather than the CSV
+    data = dataset.load(path)
+    if data.labels is None:
+        raise ValueError(f"{path} has no '{LABEL_COLUMN}' column")
+    unlabeled = int(np.count_nonzero(np.asarray(data.labels) == dataset.MISSING_LABEL))
+    if unlabeled:
+        raise ValueError(f"{path}: {unlabeled} rows have a {LABEL_COLUMN} other than M or B")
+    X = pd.DataFrame(np.array(dataset.select(data, FEATURE_COLUMNS)), columns=FEATURE_COLUMNS)
+    y = pd.Series(np.asarray(data.labels, dtype=int), name=LABEL_COLUMN)
+    return X, y
+
+
+def correlated_columns(X, threshold=CORRELATION_THRESHOLD):
+    # The notebook's rule: in the lower triangle of |corr|, drop every
+    # column that exceeds the threshold against a later column
+    corr = X.corr().abs()
+    lower = corr.mask(np.triu(np.ones_like(corr, dtype=bool)))
+    return [col for col in lower.columns if (lower[col] > threshold).any()]
+
+
+def split_and_scale(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, correlation_threshold=None):
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state)
+
+    # Imputer and scaler are fitted once, on the training split only
+    imputer = SimpleImputer(strategy='mean')
+    X_train = pd.DataFrame(imputer.fit_transform(X_train), columns=X.columns)
+    X_test = pd.DataFrame(imputer.transform(X_test), columns=X.columns)
+
+    # Correlation pruning is decided on the training rows too; the scaler
+    # then records the kept columns in feature_names_in_
+    if correlation_threshold is not None:
+        dropped = correlated_columns(X_train, correlation_threshold)
+        X_train = X_train.drop(columns=dropped)
+        X_test = X_test.drop(columns=dropped)
+
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    return X_train_scaled, X_test_scaled, np.asarray(y_train), np.asarray(y_test), scaler
+
+
+def build_model(family, params=None):
+    module, name, default_params = MODEL_FAMILIES[family]
+    estimator = getattr(importlib.import_module(module), name)
+    return estimator(**(default_params if params is None else params))
+
+
+def evaluate(model, X_train, y_train, X_test, y_test):
+    y_pred = model.predict(X_test)
+    y_proba = model.predict_proba(X_test)[:, 1]
+    return {
+        'train_accuracy': float(metrics.accuracy_score(y_train, model.predict(X_train))),
+        'test_accuracy': float(metrics.accuracy_score(y_test, y_pred)),
+        'test_recall': float(metrics.recall_score(y_test, y_pred)),
+        'test_auc': float(metrics.roc_auc_score(y_test, y_proba)),
+    }
+
+
+def fit_family(family, params, X_train, y_train, X_test, y_test):
+    # Runs in a worker process
+    start = time.perf_counter()
+    model = build_model(family, params)
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    result = evaluate(model, X_train, y_train, X_test, y_test)
+    result['fit_seconds'] = fit_seconds
+    return model, result
+
+
+def data_checksum(*arrays):
+    digest = hashlib.sha256()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def fit_cache_key(family, params, data_key):
+    module, name, _ = MODEL_FAMILIES[family]
+    spec = json.dumps([module, name, params, data_key], sort_keys=True, default=str)
+    return f"{family}-{hashlib.sha256(spec.encode()).hexdigest()[:16]}"
+
+
+def available_families(families):
+    found = []
+    for family in families:
+        try:
+            importlib.import_module(MODEL_FAMILIES[family][0])
+        except ImportError:
+            print(f"Skipping {family}: {MODEL_FAMILIES[family][0]} is not installed")
+            continue
+        found.append(family)
+    return found
+
+
+def tune_families(families, strategy, X_train, y_train, n_jobs=None):
+    # Replace the notebook's hard-coded hyperparameters with a fresh search
+    # for every family that has a search space
+    from search import SEARCH_SPACES, tune
+
+    params, reports = {}, {}
+    for family in families:
+        if family not in SEARCH_SPACES:
+            continue
+        report = tune(family, strategy, X_train, y_train, n_jobs)
+        params[family] = {**MODEL_FAMILIES[family][2], **report['best_params']}
+        reports[family] = report
+    return params, reports
+
+
+def train(families=None, data_path=DATA_PATH, output_dir=ARTIFACTS_DIR, n_jobs=None,
+          use_cache=True, params=None, search=None, correlation_threshold=CORRELATION_THRESHOLD):
+    families = available_families(families or list(MODEL_FAMILIES))
+    params = dict(params or {})
+    X, y = load_dataset(data_path)
+    X_train, X_test, y_train, y_test, scaler = split_and_scale(
+        X, y, correlation_threshold=correlation_threshold)
+
+    search_reports = {}
+    if search:
+        tuned, search_reports = tune_families(families, search, X_train, y_train, n_jobs)
+        params.update(tuned)
+
+    # Fitted models are cached by (family, params, training data), so
+    # changing one family only refits that one
+    cache_dir = os.path.join(output_dir, 'cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    data_key = data_checksum(X_train, y_train, X_test, y_test)
+    family_params = {f: params.get(f, MODEL_FAMILIES[f][2]) for f in families}
+    cache_paths = {f: os.path.join(cache_dir, fit_cache_key(f, family_params[f], data_key) + '.pkl')
+                   for f in families}
+
+    models, results = {}, {}
+    for family in families:
+        if use_cache and os.path.exists(cache_paths[family]):
+            with open(cache_paths[family], 'rb') as f:
+                models[family], results[family] = pickle.load(f)
+            results[family]['cached'] = True
+
+    to_fit = [f for f in families if f not in models]
+    start = time.perf_counter()
+    if to_fit:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {f: pool.submit(fit_family, f, family_params[f], X_train, y_train, X_test, y_test)
+                       for f in to_fit}
+            for family, future in futures.items():
+                models[family], results[family] = future.result()
+                with open(cache_paths[family], 'wb') as f:
+                    pickle.dump((models[family], results[family]), f)
+                results[family]['cached'] = False
+    wall_seconds = time.perf_counter() - start
+
+    version = time.strftime('%Y%m%d-%H%M%S') + '-' + data_key[:8]
+    version_dir = os.path.join(output_dir, version)
+    write_version(version_dir, models, scaler, results, family_params, data_key, search_reports,
+                  correlation_threshold)
+    return version_dir, results, wall_seconds, search_reports
+
+
+def write_version(version_dir, models, scaler, results, family_params, data_key, search_reports=None,
+                  correlation_threshold=None):
+    os.makedirs(os.path.join(version_dir, 'models'), exist_ok=True)
+    with open(os.path.join(version_dir, 'scaler.pkl'), 'wb') as f:
+        pickle.dump(scaler, f)
+    for family, model in models.items():
+        with open(os.path.join(version_dir, 'models', f'{family}.pkl'), 'wb') as f:
+            pickle.dump(model, f)
+    with open(os.path.join(version_dir, 'features.json'), 'w') as f:
+        json.dump(list(scaler.feature_names_in_), f, indent=2)
+    with open(os.path.join(version_dir, 'metrics.json'), 'w') as f:
+        json.dump(results, f, indent=2)
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+        json.dump({'data_checksum': data_key, 'random_state': RANDOM_STATE, 'test_size': TEST_SIZE,
+                   'correlation_threshold': correlation_threshold, 'params': family_params,
+                   'search': search_reports or {}}, f, indent=2, default=str)
+
+
+def load_version(version_dir, family='svc'):
+    # Model, scaler and feature order from one trained version
+    with open(os.path.join(version_dir, 'models', f'{family}.pkl'), 'rb') as f:
+        model = pickle.load(f)
+    with open(os.path.join(version_dir, 'scaler.pkl'), 'rb') as f:
+        scaler = pickle.load(f)
+    with open(os.path.join(version_dir, 'features.json')) as f:
+        features = json.load(f)
+    return model, scaler, features
+
+
+def load_split(version_dir, data_path=DATA_PATH):
+    # Rebuild a version's train/test split and check it is the data the
+    # version was trained on. Selecting the version's columns up front gives
+    # the same split and scaling whether or not it pruned correlated features.
+    with open(os.path.join(version_dir, 'features.json')) as f:
+        features = json.load(f)
+    with open(os.path.join(version_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    X, y = load_dataset(data_path)
+    X_train, X_test, y_train, y_test, _ = split_and_scale(X[features], y)
+    if data_checksum(X_train, y_train, X_test, y_test) != manifest['data_checksum']:
+        raise ValueError(f"{data_path} is not the data {version_dir} was trained on")
+    return X_train, X_test, y_train, y_test
+
+
+def deploy(version_dir, family='svc', model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    # Copy into the paths app.py and main1.py load from; the registry picks
+    # the new files up without a restart. Both files are staged under temp
+    # names first, then the pair stamp naming both is published, then they
+    # are renamed into place. While the stamp exists the registry only loads
+    # a model and scaler whose bytes match it, so it never sees a mixed pair;
+    # it is removed once both renames are done.
+    from registry import remove_pair_stamp, write_pair_stamp
+
+    pairs = ((os.path.join(version_dir, 'models', f'{family}.pkl'), model_path),
+             (os.path.join(version_dir, 'scaler.pkl'), scaler_path))
+    for src, dst in pairs:
+        shutil.copyfile(src, dst + '.tmp')
+    with open(model_path + '.tmp', 'rb') as f:
+        model_bytes = f.read()
+    with open(scaler_path + '.tmp', 'rb') as f:
+        scaler_bytes = f.read()
+    write_pair_stamp(model_bytes, scaler_bytes, model_path)
+    for _, dst in pairs:
+        os.replace(dst + '.tmp', dst)
+    remove_pair_stamp(model_path)
+
+    # Keep the compact artifact in step so main1.py does not fall back to
+    # the pickles
+    if family == 'svc':
+        from export_artifact import export
+
+        model, scaler, features = load_version(version_dir, family)
+        export(model, scaler, ARTIFACT_PATH, features, pickle_version(model_path, scaler_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the notebook model families in parallel')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--output', default=ARTIFACTS_DIR)
+    parser.add_argument('--families', default=','.join(MODEL_FAMILIES),
+                        help='comma-separated subset of: ' + ', '.join(MODEL_FAMILIES))
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--no-cache', action='store_true', help='refit every family')
+    parser.add_argument('--all-features', action='store_true',
+                        help=f'keep all 30 features instead of dropping those correlated above {CORRELATION_THRESHOLD}')
+    parser.add_argument('--search', choices=['grid', 'halving', 'hyperband', 'precomputed'],
+                        help='tune the DT, SVC and GBDT hyperparameters before fitting')
+    parser.add_argument('--compress', action='store_true',
+                        help='build faster SVC variants and gate them on the held-out split')
+    parser.add_argument('--compress-tolerance', type=float, default=0.01,
+                        help='largest allowed drop in held-out accuracy, recall and AUC')
+    parser.add_argument('--deploy', metavar='FAMILY', help='copy this family to breast_cancer.pkl/scaler.pkl')
+    args = parser.parse_args()
+
+    families = [f.strip() for f in args.families.split(',') if f.strip()]
+    unknown = [f for f in families if f not in MODEL_FAMILIES]
+    if unknown:
+        parser.error(f"Unknown families: {', '.join(unknown)}")
+    if args.compress and 'svc' not in families:
+        parser.error("--compress needs the svc family")
+
+    version_dir, results, wall_seconds, search_reports = train(
+        families, args.data, args.output, args.jobs, use_cache=not args.no_cache, search=args.search,
+        correlation_threshold=None if args.all_features else CORRELATION_THRESHOLD)
+
+    for family, r in search_reports.items():
+        print(f"{args.search} search for {family}: {r['fits']} fits in {r['wall_seconds']:.2f}s, "
+              f"best cv {r['best_score']:.4f} with {r['best_params']}")
+
+    print(f"{'family':<6} {'train acc':>10} {'test acc':>9} {'recall':>7} {'auc':>7} {'fit s':>7}")
+    for family, r in results.items():
+        note = ' (cached)' if r['cached'] else ''
+        print(f"{family:<6} {r['train_accuracy']:>10.4f} {r['test_accuracy']:>9.4f} "
+              f"{r['test_recall']:>7.4f} {r['test_auc']:>7.4f} {r['fit_seconds']:>7.2f}{note}")
+    print(f"Wrote {version_dir} in {wall_seconds:.2f}s")
+
+    if args.compress:
+        from compress import compress_version, print_report
+
+        print_report(compress_version(version_dir, args.data, args.compress_tolerance))
+
+    if args.deploy:
+        deploy(version_dir, args.deploy)
+        print(f"Deployed {args.deploy} to {MODEL_PATH} and {SCALER_PATH}")
+
+
+if __name__ == '__main__':
+    main()